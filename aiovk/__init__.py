@@ -1,5 +1,5 @@
 __version__ = '4.1.0'
 
 from .api import API
-from .sessions import ImplicitSession, TokenSession, AuthorizationCodeSession
+from .sessions import ImplicitSession, TokenSession, AuthorizationCodeSession, TokenPoolSession
 from .longpoll import LongPoll
@@ -1,4 +1,38 @@
+import asyncio
+from collections import deque
 from functools import partial
+from itertools import islice
+
+# Param with list of ids and its max length for methods accepting many ids at once
+BULK_METHODS = {
+    'users.get': ('user_ids', 1000),
+    'groups.getById': ('group_ids', 500),
+    'groups.isMember': ('user_ids', 500),
+    'friends.areFriends': ('user_ids', 1000),
+    'messages.getById': ('message_ids', 100),
+    'wall.getById': ('posts', 100),
+}
+
+
+def prepare_params(params: dict) -> dict:
+    """Returns params with lists and tuples serialized as comma-separated strings"""
+    return {
+        name: ','.join(map(str, value)) if isinstance(value, (list, tuple)) else value
+        for name, value in params.items()
+    }
+
+
+def merge_responses(responses: list):
+    """Merges responses of chunked requests keeping the order of chunks"""
+    first = responses[0]
+    if isinstance(first, list):
+        return [item for response in responses for item in response]
+    if isinstance(first, dict) and 'items' in first:
+        merged = dict(first, items=[item for response in responses for item in response['items']])
+        if 'count' in first:
+            merged['count'] = sum(response['count'] for response in responses)
+        return merged
+    return responses
 
 
 class API:
@@ -25,9 +59,76 @@ class Request:
     async def __call__(self, **method_args):
         timeout = method_args.pop('timeout', None)
         need_raw_response = method_args.pop('raw_response', False)
+        if self._method_name in BULK_METHODS and not need_raw_response:
+            ids_param, max_ids = BULK_METHODS[self._method_name]
+            ids = method_args.get(ids_param)
+            if isinstance(ids, (list, tuple)) and len(ids) > max_ids:
+                return await self._call_chunked(method_args, ids_param, max_ids, timeout)
+        method_args = prepare_params(method_args)
         self._method_args = method_args
         return await self._api._session.send_api_request(self._method_name, method_args, timeout, need_raw_response)
 
+    async def _call_chunked(self, method_args: dict, ids_param: str, max_ids: int, timeout: int = None):
+        """
+        Splits the list of ids into chunks, sends them concurrently and merges responses in the input order.
+        Chunks are limited by the rate limit of the driver or packed by `ExecuteBatchSession` if it is used
+        """
+        ids = method_args[ids_param]
+        chunks = [ids[i: i + max_ids] for i in range(0, len(ids), max_ids)]
+        responses = await asyncio.gather(*(
+            self._api._session.send_api_request(
+                self._method_name, prepare_params(dict(method_args, **{ids_param: chunk})), timeout
+            )
+            for chunk in chunks
+        ))
+        return merge_responses(responses)
+
+    async def iterate(self, prefetch: int = 4, **method_args):
+        """
+        Iterates over items of all pages of the method response.
+
+        Pages of methods with `offset` param are requested concurrently after the first one reports `count`.
+        Pages of methods with `next_from` field in response are requested one by one using `start_from` param
+
+        :param prefetch: max number of pages requested concurrently
+        """
+        timeout = method_args.pop('timeout', None)
+        method_args = prepare_params(method_args)
+        send = partial(self._api._session.send_api_request, self._method_name, timeout=timeout)
+
+        response = await send(dict(method_args))
+        for item in response['items']:
+            yield item
+
+        if 'next_from' in response:
+            while response.get('next_from'):
+                response = await send(dict(method_args, start_from=response['next_from']))
+                for item in response['items']:
+                    yield item
+            return
+
+        # Server may return fewer items than requested count, e.g. 100 posts of `wall.get`
+        step = len(response['items'])
+        if method_args.get('count'):
+            step = min(step, int(method_args['count']))
+        if not step:
+            return
+        offsets = iter(range(int(method_args.get('offset', 0)) + step, response['count'], step))
+        pages = deque()
+        try:
+            for offset in islice(offsets, prefetch):
+                pages.append(asyncio.ensure_future(send(dict(method_args, offset=offset))))
+            while pages:
+                response = await pages.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pages.append(asyncio.ensure_future(send(dict(method_args, offset=offset))))
+                for item in response['items']:
+                    yield item
+        finally:
+            for page in pages:
+                page.cancel()
+
 
 class LazyAPI:
     def __init__(self, session):
@@ -52,6 +153,7 @@ class LazyRequest:
 
     def __call__(self, **method_args):
         timeout = method_args.pop('timeout', None)
+        method_args = prepare_params(method_args)
         self._method_args = method_args
         return partial(
             self._api._session.send_api_request,
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Hashable, Tuple
+
+from .exceptions import VkAPIError
+from .sessions import BaseSession, SessionWrapper
+
+
+def normalize_value(value) -> str:
+    """Returns value as it is sent to the server, lists are sent as comma-separated strings"""
+    if isinstance(value, (list, tuple, set)):
+        return ','.join(map(str, value))
+    return str(value)
+
+
+def make_request_key(method_name: str, params: dict = None, raw_response: bool = False) -> tuple:
+    """Returns hashable key of the api call that does not depend on the order of params"""
+    items = tuple(sorted((name, normalize_value(value)) for name, value in (params or {}).items()))
+    return method_name, bool(raw_response), items
+
+
+class TTLCache:
+    """Bounded mapping with least recently used eviction and expiration time of every item"""
+
+    def __init__(self, maxsize: int = 10000):
+        """
+        :param maxsize: max number of items
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        :return: flag of presence and value of the item
+        """
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value, ttl: float) -> None:
+        """
+        :param ttl: time in seconds while the item is valid
+        """
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class CacheSession(SessionWrapper):
+    """
+    Caches responses of read-only api methods.
+    Cached responses are shared between callers, so they must not be modified
+    """
+
+    # Time in seconds while response of the method is valid
+    TTL = {
+        'users.get': 300,
+        'groups.getById': 300,
+        'utils.resolveScreenName': 3600,
+        'database.getCountriesById': 86400,
+        'database.getCitiesById': 86400,
+    }
+    # Errors that do not change for a long time, e.g. deleted user or invalid id
+    ERROR_CODES = {18, 30, 113, 125}
+
+    def __init__(self, session: BaseSession, ttl: dict = None, maxsize: int = 10000,
+                 negative_ttl: float = 60, error_codes: set = None):
+        """
+        :param session: wrapped session
+        :param ttl: time in seconds while response of the method is valid, see `CacheSession.TTL`
+        :param maxsize: max number of cached responses
+        :param negative_ttl: time in seconds while the error is valid
+        :param error_codes: codes of errors that are cached, see `CacheSession.ERROR_CODES`
+        """
+        super().__init__(session)
+        self.ttl = dict(self.TTL if ttl is None else ttl)
+        self.cache = TTLCache(maxsize)
+        self.negative_ttl = negative_ttl
+        self.error_codes = set(self.ERROR_CODES if error_codes is None else error_codes)
+        self.stats = Counter()
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        ttl = self.ttl.get(method_name)
+        if not ttl:
+            return await self.session.send_api_request(method_name, params, timeout, raw_response)
+
+        key = make_request_key(method_name, params, raw_response)
+        found, value = self.cache.get(key)
+        if found:
+            self.stats['hits'] += 1
+            if isinstance(value, VkAPIError):
+                raise value.with_traceback(None)
+            return value
+
+        self.stats['misses'] += 1
+        try:
+            result = await self.session.send_api_request(method_name, params, timeout, raw_response)
+        except VkAPIError as e:
+            if e.error_code in self.error_codes:
+                self.cache.set(key, e, self.negative_ttl)
+            raise
+        self.cache.set(key, result, ttl)
+        return result
+
+
+class SingleFlightSession(SessionWrapper):
+    """
+    Sends identical api calls issued concurrently only once,
+    all callers get the same result or exception
+    """
+
+    # By default only calls of read-only methods are de-duplicated, e.g. `users.get` or `groups.isMember`
+    READ_ONLY_PREFIXES = ('get', 'search', 'is', 'resolve')
+
+    def __init__(self, session: BaseSession, methods: set = None):
+        """
+        :param session: wrapped session
+        :param methods: names of methods which calls are de-duplicated, read-only methods by default
+        """
+        super().__init__(session)
+        self.methods = None if methods is None else set(methods)
+        self.stats = Counter()
+        self._in_flight = {}
+
+    def is_deduplicated(self, method_name: str) -> bool:
+        if self.methods is not None:
+            return method_name in self.methods
+        return method_name.rpartition('.')[2].startswith(self.READ_ONLY_PREFIXES)
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        if not self.is_deduplicated(method_name):
+            return await self.session.send_api_request(method_name, params, timeout, raw_response)
+
+        key = make_request_key(method_name, params, raw_response)
+        task = self._in_flight.get(key)
+        if task is None:
+            self.stats['requests'] += 1
+            task = asyncio.ensure_future(self.session.send_api_request(method_name, params, timeout, raw_response))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        else:
+            self.stats['shared'] += 1
+        # Cancellation of one caller must not cancel the request of others
+        return await asyncio.shield(task)
+
+    def _request_done(self, key: tuple, task: asyncio.Future) -> None:
+        del self._in_flight[key]
+        if not task.cancelled():
+            # Mark exception as retrieved even if all callers were cancelled
+            task.exception()
@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from typing import Hashable, Optional
+
+from .events import CHAT_PEER_OFFSET
+from .exceptions import VkAPIError
+from .longpoll import BaseLongPoll, UserLongPoll
+
+# Mode flag that adds pts to user long poll responses
+RETURN_PTS_MODE = 32
+
+# Number of leading fields that identify user long poll event by event code
+EVENT_IDENTITY_LENGTH = {
+    1: 3, 2: 3, 3: 3,  # message flags: message id and flags
+    4: 2, 5: 2,  # new and edited messages: message id
+    6: 3, 7: 3,  # read messages: peer id and local id
+    10: 3, 11: 3, 12: 3,  # conversation flags: peer id and flags
+    13: 3, 14: 3,  # deleted and restored messages: peer id and local id
+}
+
+
+def get_event_identity(event) -> Hashable:
+    """
+    Returns key that is equal for the same event received from history and from the long poll,
+    history events have fewer fields than long poll ones
+    """
+    if isinstance(event, list):
+        length = EVENT_IDENTITY_LENGTH.get(event[0])
+        if length is not None:
+            return tuple(event[:length])
+    return json.dumps(event, sort_keys=True)
+
+
+def fill_message(event: list, message: dict) -> list:
+    """
+    Adds fields of long poll event to the history event of a new message, history contains only
+    code, message id, flags and peer id, the rest is taken from the message object of the history
+    """
+    peer_id = message.get('peer_id', event[3] if len(event) > 3 else None)
+    extra = {}
+    if peer_id is not None and peer_id > CHAT_PEER_OFFSET:
+        extra['from'] = str(message.get('from_id'))
+    attachments = {}
+    for number, attachment in enumerate(message.get('attachments', []), 1):
+        attachment_type = attachment.get('type')
+        item = attachment.get(attachment_type) or {}
+        attachments[f'attach{number}_type'] = attachment_type
+        attachments[f'attach{number}'] = f'{item.get("owner_id")}_{item.get("id")}'
+    return [
+        event[0], event[1], event[2] if len(event) > 2 else 0, peer_id, message.get('date'),
+        message.get('text', ''), extra, attachments, message.get('random_id'), message.get('conversation_message_id'),
+    ]
+
+
+class BaseCheckpointStorage:
+    """Stores position of long polls: `ts` and `pts` by the name of long poll"""
+
+    def load(self, name: str) -> Optional[dict]:
+        """
+        :return: dict with `ts` and `pts` or None if there is no checkpoint
+        """
+        raise NotImplementedError
+
+    def save(self, name: str, state: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileCheckpointStorage(BaseCheckpointStorage):
+    """Stores checkpoints of all long polls in one json file, the file is replaced atomically"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path) as f:
+                self._states = json.load(f)
+        except FileNotFoundError:
+            self._states = {}
+
+    def load(self, name: str) -> Optional[dict]:
+        return self._states.get(name)
+
+    def save(self, name: str, state: dict) -> None:
+        self._states[name] = state
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._states, f)
+        os.replace(tmp_path, self.path)
+
+
+class SqliteCheckpointStorage(BaseCheckpointStorage):
+    """Stores checkpoints in a table of SQLite database"""
+
+    def __init__(self, path: str, table: str = 'aiovk_checkpoints'):
+        self.table = table
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} (name TEXT PRIMARY KEY, ts INTEGER, pts INTEGER, updated REAL)'
+        )
+        self.connection.commit()
+
+    def load(self, name: str) -> Optional[dict]:
+        row = self.connection.execute(f'SELECT ts, pts FROM {self.table} WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return {'ts': row[0], 'pts': row[1]}
+
+    def save(self, name: str, state: dict) -> None:
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO {self.table} (name, ts, pts, updated) VALUES (?, ?, ?, ?)',
+            (name, state.get('ts'), state.get('pts'), time.time())
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ResumableLongPoll:
+    """
+    Saves position of the long poll after its events are processed and continues from it after restart.
+    User long poll gets missed events by `messages.getLongPollHistory`, bots long poll continues from saved `ts`.
+    Events of new messages from history get text, sender and attachments of messages in the long poll format.
+    Events that are received both from history and from the long poll are skipped
+    """
+
+    def __init__(self, long_poll: BaseLongPoll, storage: BaseCheckpointStorage, name: str = 'default',
+                 flush_interval: float = 5, dedup_size: int = 10000, history_args: dict = None):
+        """
+        :param long_poll: user or bots long poll, pts is added to the mode of user long poll
+        :param storage: storage of checkpoints
+        :param name: name of the long poll in the storage
+        :param flush_interval: min time in seconds between saves of checkpoint
+        :param dedup_size: max number of recovered events that new events are checked against
+        :param history_args: additional params of `messages.getLongPollHistory`, e.g. `fields` or `lp_version`
+        """
+        self.long_poll = long_poll
+        self.storage = storage
+        self.name = name
+        self.flush_interval = flush_interval
+        self.dedup_size = dedup_size
+        self.history_args = history_args or {}
+        if isinstance(long_poll, UserLongPoll):
+            long_poll.base_params['mode'] = long_poll.base_params.get('mode', 0) | RETURN_PTS_MODE
+        self.stats = Counter()
+        self._seen = OrderedDict()
+        self._state = None
+        self._flushed = time.monotonic()
+
+    async def iter(self, prefetch: int = 0):
+        """
+        Iterates over missed and new events. Checkpoint is saved after all events of a response are processed
+
+        :param prefetch: see `BaseLongPoll.iter`
+        """
+        async for event in self.recover():
+            yield event
+        responses = self.long_poll.iter_responses(prefetch)
+        try:
+            async for response in responses:
+                if not self._seen:
+                    for event in response['updates']:
+                        yield event
+                else:
+                    duplicates = self.stats['duplicates']
+                    for event in response['updates']:
+                        if not self._is_duplicate(event):
+                            yield event
+                    if duplicates == self.stats['duplicates']:
+                        # New events don't overlap with recovered ones anymore
+                        self._seen.clear()
+                self.update({'ts': response['ts'], 'pts': response.get('pts', self.long_poll.pts)})
+        finally:
+            # Position of the long poll is restored before the iteration is finished
+            await responses.aclose()
+
+    async def recover(self):
+        """Iterates over events missed since the saved checkpoint and prepares the long poll for new ones"""
+        state = self.storage.load(self.name)
+        if state is None:
+            return
+        long_poll = self.long_poll
+        # Fresh server and key, user long poll gets current pts too
+        await long_poll._get_long_poll_server(need_pts=True)
+        if not isinstance(long_poll, UserLongPoll):
+            long_poll.ts = state['ts']
+            return
+        if state.get('pts') is None:
+            return
+
+        pts = state['pts']
+        while True:
+            try:
+                response = await long_poll.api(
+                    'messages.getLongPollHistory', ts=state['ts'], pts=pts, **self.history_args
+                )
+            except VkAPIError:
+                # History is too old or unavailable, events are lost
+                self.stats['gaps'] += 1
+                return
+            messages = {message['id']: message for message in response.get('messages', {}).get('items', [])}
+            for event in response.get('history', []):
+                self.stats['recovered'] += 1
+                if event[0] == 4 and len(event) <= 4 and event[1] in messages:
+                    event = fill_message(event, messages[event[1]])
+                if not self._is_duplicate(event):
+                    yield event
+            pts = response.get('new_pts', pts)
+            if not response.get('more'):
+                break
+        self.update({'ts': long_poll.ts, 'pts': pts})
+
+    def update(self, state: dict) -> None:
+        """Remembers position of processed events and saves it if flush interval has passed"""
+        self._state = state
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._state is not None:
+            self.storage.save(self.name, self._state)
+            self._state = None
+        self._flushed = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        self.storage.close()
+
+    def _is_duplicate(self, event) -> bool:
+        key = get_event_identity(event)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.stats['duplicates'] += 1
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
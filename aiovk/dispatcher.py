@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Hashable, Optional
+
+from .events import CHAT_PEER_OFFSET, Event
+
+logger = logging.getLogger(__name__)
+
+# Index of peer id in user long poll events by event code
+USER_EVENT_PEER_INDEX = {
+    1: 3, 2: 3, 3: 3, 4: 3, 5: 3,  # message flags, new and edited messages
+    6: 1, 7: 1,  # read messages
+    10: 1, 11: 1, 12: 1,  # conversation flags
+    13: 1, 14: 1,  # deleted messages
+    52: 2,  # chat info changes
+    61: 1,  # typing in dialog
+    63: 1, 64: 1,  # typing and recording in chat
+}
+
+# Index of chat id in user long poll events by event code, peer id of chat is the chat id plus offset
+USER_EVENT_CHAT_INDEX = {
+    51: 1,  # chat changes
+    62: 2,  # typing in chat
+}
+
+
+def get_event_type(event) -> Hashable:
+    """Returns `type` of bots long poll event or code of user long poll event, raw or decoded"""
+    if isinstance(event, dict):
+        return event.get('type')
+    if isinstance(event, Event):
+        return event.code
+    return event[0]
+
+
+def get_peer_id(event) -> Optional[int]:
+    """Returns id of conversation or user the event belongs to"""
+    if isinstance(event, dict):
+        obj = event.get('object')
+        if not isinstance(obj, dict):
+            return None
+        # Since API 5.103 message events contain message in the `message` field
+        message = obj.get('message')
+        if isinstance(message, dict):
+            obj = message
+        for field in ('peer_id', 'from_id', 'user_id', 'owner_id'):
+            if obj.get(field) is not None:
+                return obj[field]
+        return None
+    if isinstance(event, Event):
+        return getattr(event, 'peer_id', None)
+
+    code = event[0]
+    index = USER_EVENT_CHAT_INDEX.get(code)
+    if index is not None:
+        return CHAT_PEER_OFFSET + event[index] if len(event) > index else None
+    index = USER_EVENT_PEER_INDEX.get(code)
+    if index is None or len(event) <= index:
+        return None
+    return event[index]
+
+
+class EventDispatcher:
+    """
+    Routes long poll events to handlers by event type. Events are sharded by peer id onto a fixed number
+    of workers, so events of one conversation are handled in order and different conversations concurrently.
+    The number of dispatched but not handled events is limited, `dispatch` waits for a free place
+    """
+
+    def __init__(self, workers: int = 16, max_in_flight: int = 1000):
+        """
+        :param workers: number of coroutines that call handlers
+        :param max_in_flight: max number of dispatched events that are not handled yet
+        """
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.handlers = defaultdict(list)
+        self.stats = Counter()
+        # Number of events, total and max time in seconds of their handling for every event type
+        self.latency = defaultdict(lambda: [0, 0.0, 0.0])
+        # Total time in seconds that handled events waited in queues
+        self.queue_time = 0.0
+        # Number of dispatched events that are not handled yet
+        self.in_flight = 0
+        self._queues = []
+        self._tasks = []
+        self._semaphore = None
+        self._round_robin = itertools.count()
+
+    def register(self, event_type: Hashable, handler: Callable) -> None:
+        """
+        :param event_type: `type` of bots long poll event, code of user long poll event or None for all events
+        :param handler: coroutine function with event argument
+        """
+        self.handlers[event_type].append(handler)
+
+    def on(self, event_type: Hashable = None):
+        """Decorator that registers handler"""
+        def decorator(handler):
+            self.register(event_type, handler)
+            return handler
+        return decorator
+
+    @property
+    def queue_sizes(self) -> list:
+        """Number of events waiting in the queue of every worker"""
+        return [queue.qsize() for queue in self._queues]
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._queues = [asyncio.Queue() for _ in range(self.workers)]
+            self._tasks = [asyncio.ensure_future(self._work(queue)) for queue in self._queues]
+
+    async def dispatch(self, event) -> None:
+        """Puts the event into the queue of its worker, waits while too many events are not handled"""
+        self.start()
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        if semaphore is not self._semaphore:
+            # Dispatcher has been closed while the event waited for a free place, it is dropped
+            return
+        self.in_flight += 1
+        key = self.get_shard_key(event)
+        if key is None:
+            # Events without conversation are not ordered
+            shard = next(self._round_robin) % self.workers
+        else:
+            shard = hash(key) % self.workers
+        self._queues[shard].put_nowait((event, time.monotonic()))
+        self.stats['dispatched'] += 1
+
+    async def run(self, events) -> None:
+        """
+        Dispatches all events of async iterator, e.g. `long_poll.iter()`
+        """
+        async for event in events:
+            await self.dispatch(event)
+
+    async def join(self) -> None:
+        """Waits until all dispatched events are handled"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def close(self) -> None:
+        """Stops workers, events that are not handled yet are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+        self.in_flight = 0
+        if self._semaphore is not None:
+            semaphore, self._semaphore = self._semaphore, None
+            # Wakes up dispatches that wait for a free place
+            for _ in range(self.max_in_flight):
+                semaphore.release()
+
+    def get_event_type(self, event) -> Hashable:
+        return get_event_type(event)
+
+    def get_shard_key(self, event) -> Optional[Hashable]:
+        """Events with the same key are handled in order, None means that order is not important"""
+        return get_peer_id(event)
+
+    def handle_error(self, event, exception: Exception) -> None:
+        logger.error('Handler of event %r failed', event, exc_info=exception)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            event, dispatched = await queue.get()
+            event_type = self.get_event_type(event)
+            self.queue_time += time.monotonic() - dispatched
+            try:
+                await self._handle(event_type, event)
+            finally:
+                queue.task_done()
+                self.in_flight -= 1
+                self._semaphore.release()
+
+    async def _handle(self, event_type: Any, event) -> None:
+        started = time.monotonic()
+        for handler in self.handlers.get(event_type, []) + self.handlers.get(None, []):
+            try:
+                await handler(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                self.handle_error(event, e)
+        latency = time.monotonic() - started
+        stats = self.latency[event_type]
+        stats[0] += 1
+        stats[1] += latency
+        stats[2] = max(stats[2], latency)
+        self.stats['handled'] += 1
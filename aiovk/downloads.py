@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+import aiohttp
+
+from .drivers import BaseDriver, HttpDriver
+
+
+class MediaDownloader:
+    """
+    Downloads media files once per cache lifetime. Identical urls requested concurrently are downloaded once,
+    content is stored in the directory by its sha256 hash and the least recently used files are evicted
+    when the cache exceeds its max size. Files are ordered by usage in memory, the directory is scanned once
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 1 << 30, concurrency: int = 16, limit_per_host: int = 8,
+                 timeout: int = 30, driver: BaseDriver = None, low_water: float = 0.9):
+        """
+        :param cache_dir: directory for cached files, it is created if it does not exist
+        :param max_size: max total size of cached files in bytes
+        :param low_water: part of max size that the cache is shrunk to by eviction,
+                          so eviction does not run again on the next download
+        :param concurrency: max number of files downloaded at once
+        :param limit_per_host: max number of connections to one host, used only for the default driver
+        :param timeout: max time between chunks, used only for the default driver
+        :param driver: driver with `iter_bin` method, new `HttpDriver` by default
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.low_water = low_water
+        if driver is None:
+            connector = aiohttp.TCPConnector(limit_per_host=limit_per_host)
+            driver = HttpDriver(timeout, session=aiohttp.ClientSession(connector=connector))
+        self.driver = driver
+        self.stats = Counter()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight = {}
+        self._size = 0
+        # Sizes of cached files by path from the least to the most recently used, loaded on the first download
+        self._index = None
+        for name in ('objects', 'urls', 'tmp'):
+            os.makedirs(os.path.join(cache_dir, name), exist_ok=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def fetch(self, url: str) -> str:
+        """
+        :return: path of the cached file with the content of url
+        """
+        path = self._lookup(url)
+        if path is not None:
+            self.stats['hits'] += 1
+            return path
+
+        task = self._in_flight.get(url)
+        if task is None:
+            self.stats['misses'] += 1
+            task = asyncio.ensure_future(self._download(url))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        else:
+            self.stats['shared'] += 1
+        # Cancellation of one caller must not cancel the download for others
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, urls: List[str]) -> List[str]:
+        """
+        :return: paths of cached files in the order of urls
+        """
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+    async def read(self, url: str) -> bytes:
+        with open(await self.fetch(url), 'rb') as f:
+            return f.read()
+
+    async def close(self) -> None:
+        await self.driver.close()
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, 'urls', hashlib.sha1(url.encode()).hexdigest())
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    def _lookup(self, url: str) -> Optional[str]:
+        url_path = self._url_path(url)
+        try:
+            with open(url_path) as f:
+                path = self._object_path(f.read())
+            self._touch(path)
+        except FileNotFoundError:
+            if os.path.exists(url_path):
+                # Content has been evicted
+                os.remove(url_path)
+            return None
+        return path
+
+    async def _download(self, url: str) -> str:
+        tmp_path = os.path.join(self.cache_dir, 'tmp', uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        async with self._semaphore:
+            try:
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in self.driver.iter_bin(url, {}):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        digest = digest.hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            # The same content has been downloaded from another url
+            os.remove(tmp_path)
+            self._touch(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._add_size(size, path)
+
+        tmp_path = os.path.join(self.cache_dir, 'tmp', uuid.uuid4().hex)
+        with open(tmp_path, 'w') as f:
+            f.write(digest)
+        os.replace(tmp_path, self._url_path(url))
+        return path
+
+    def _touch(self, path: str) -> None:
+        # Modification time keeps the order of usage between restarts
+        os.utime(path)
+        if self._index is not None and path in self._index:
+            self._index.move_to_end(path)
+
+    def _load_index(self) -> None:
+        objects = []
+        for root, _, files in os.walk(os.path.join(self.cache_dir, 'objects')):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                objects.append((stat.st_mtime, path, stat.st_size))
+        objects.sort()
+        self._index = OrderedDict((path, size) for _, path, size in objects)
+        self._size = sum(self._index.values())
+
+    def _add_size(self, size: int, path: str) -> None:
+        if self._index is None:
+            # The new file is already in the directory
+            self._load_index()
+        else:
+            self._index[path] = size
+            self._size += size
+        if self._size > self.max_size:
+            self._evict(keep=path)
+
+    def _evict(self, keep: str) -> None:
+        """Removes the least recently used files except `keep` until the cache fits its low water mark"""
+        target = self.max_size * self.low_water
+        for path, size in list(self._index.items()):
+            if self._size <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._size -= size
+            self.stats['evicted'] += 1
@@ -1,5 +1,10 @@
+import asyncio
+import os
+
 import aiohttp
 
+from .jsoncodec import JsonCodec, get_codec
+
 try:
     from aiohttp_socks.connector import ProxyConnector
 except ImportError as e:
@@ -7,9 +12,14 @@ except ImportError as e:
 
 
 class BaseDriver:
-    def __init__(self, timeout=10, loop=None):
+    def __init__(self, timeout=10, loop=None, json_codec=None):
+        """
+        :param timeout: default timeout for all requests
+        :param json_codec: codec object or name of json backend, see `aiovk.jsoncodec.get_codec`
+        """
         self.timeout = timeout
         self._loop = loop
+        self.json_codec: JsonCodec = get_codec(json_codec)
 
     async def post_json(self, url, params, headers=None, timeout=None):
         """
@@ -25,6 +35,28 @@ class BaseDriver:
         """
         raise NotImplementedError
 
+    def iter_bin(self, url, params, headers=None, timeout=None, chunk_size=65536):
+        """
+        :param params: dict of query params
+        :param timeout: max time between chunks
+        :param chunk_size: max size of chunk in bytes
+        :return: async iterator over chunks of binary body of response
+        """
+        raise NotImplementedError
+
+    async def download(self, url, file, params=None, headers=None, timeout=None, chunk_size=65536, resume=False):
+        """
+        Writes binary body of response to the file, only one chunk is kept in memory
+
+        :param file: path or binary file object
+        :param params: dict of query params
+        :param timeout: max time between chunks
+        :param chunk_size: max size of chunk in bytes
+        :param resume: continue downloading of the existing file by path using Range request
+        :return: http status code, number of written bytes
+        """
+        raise NotImplementedError
+
     async def get_text(self, url, params, headers=None, timeout=None):
         """
         :param params: dict of query params
@@ -32,6 +64,16 @@ class BaseDriver:
         """
         raise NotImplementedError
 
+    async def get_json(self, url, params, headers=None, timeout=None):
+        """
+        :param params: dict of query params
+        :return: http status code, dict from json response or None for error status code
+        """
+        status, text, _ = await self.get_text(url, params, headers=headers, timeout=timeout)
+        if status >= 400:
+            return status, None
+        return status, self.json_codec.loads(text)
+
     async def post_text(self, url, data, headers=None, timeout=None):
         """
         :param data: dict pr string
@@ -39,48 +81,317 @@ class BaseDriver:
         """
         raise NotImplementedError
 
+    async def post_files(self, url, files, headers=None, timeout=None):
+        """
+        Sends files as multipart form without reading them into memory
+
+        :param files: dict of field names and files. File is path, bytes, binary file object
+                      or tuple of filename and one of them
+        :param timeout: max time between chunks
+        :return: http status code, dict from json response
+        """
+        raise NotImplementedError
+
+    def get_long_poll_driver(self):
+        """
+        Returns driver for hanging long poll requests, so they don't occupy connections of api requests.
+        By default it is the driver itself
+        """
+        return self
+
+    def get_rate_delay(self, url=None, params=None) -> float:
+        """
+        Returns time in seconds that the request would wait for the rate limit of the driver, 0 without limits
+        """
+        return 0.0
+
     async def close(self):
         raise NotImplementedError
 
 
 class HttpDriver(BaseDriver):
-    def __init__(self, timeout=10, loop=None, session=None):
-        super().__init__(timeout, loop)
+    # Hosts that get connections before the first requests
+    WARM_UP_URLS = ('https://api.vk.com/',)
+
+    def __init__(self, timeout=10, loop=None, session=None, json_codec=None, long_poll_limit=100):
+        """
+        :param session: http session, a new one is created by default
+        :param long_poll_limit: max number of connections of long poll requests, it is not used
+                                with the passed session, long poll requests are sent with it
+        """
+        super().__init__(timeout, loop, json_codec)
         if not session:
             self.session = aiohttp.ClientSession(loop=loop)
         else:
             self.session = session
+        # Connector of the passed session may have settings that long poll requests need, e.g. ssl or proxy
+        self._shared_long_poll_session = bool(session)
+        self.long_poll_limit = long_poll_limit
+        self._long_poll_driver = None
+        self._keep_alive = None
 
     async def post_json(self, url, params, headers=None, timeout=None):
         async with self.session.post(url, data=params, headers=headers, timeout=timeout or self.timeout) as response:
-            return response.status, await response.json()
+            return response.status, await self._read_json(response)
 
     async def get_bin(self, url, params, headers=None, timeout=None):
         async with self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout) as response:
             return response.status, await response.read()
 
+    async def _read_json(self, response):
+        """
+        Raises `aiohttp.ClientResponseError` with status of the response if its body is not json,
+        e.g. html page of 502 error, so it is handled as any other failed response
+        """
+        body = await response.read()
+        try:
+            return self.json_codec.loads(body)
+        except ValueError:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status,
+                message='Response body is not json', headers=response.headers
+            )
+
+    def _stream_timeout(self, timeout=None):
+        # Total time of streaming depends on size of body, so only time between chunks is limited
+        return aiohttp.ClientTimeout(total=None, sock_connect=timeout or self.timeout, sock_read=timeout or self.timeout)
+
+    async def iter_bin(self, url, params, headers=None, timeout=None, chunk_size=65536):
+        """Raises `aiohttp.ClientResponseError` for error status code"""
+        async with self.session.get(url, params=params, headers=headers,
+                                    timeout=self._stream_timeout(timeout)) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def download(self, url, file, params=None, headers=None, timeout=None, chunk_size=65536, resume=False):
+        is_path = isinstance(file, (str, os.PathLike))
+        headers = dict(headers or {})
+        if resume and is_path and os.path.exists(file) and os.path.getsize(file):
+            headers[aiohttp.hdrs.RANGE] = f'bytes={os.path.getsize(file)}-'
+
+        async with self.session.get(url, params=params, headers=headers,
+                                    timeout=self._stream_timeout(timeout)) as response:
+            # 416 means that the file has been already downloaded
+            if response.status >= 400:
+                return response.status, 0
+            if not is_path:
+                return response.status, await self._write(response, file, chunk_size)
+            # Server may ignore Range header and send the whole body
+            with open(file, 'ab' if response.status == 206 else 'wb') as f:
+                return response.status, await self._write(response, f, chunk_size)
+
+    @staticmethod
+    async def _write(response, file, chunk_size):
+        written = 0
+        async for chunk in response.content.iter_chunked(chunk_size):
+            file.write(chunk)
+            written += len(chunk)
+        return written
+
     async def get_text(self, url, params, headers=None, timeout=None):
         async with self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout) as response:
             return response.status, await response.text(), response.real_url
 
+    async def get_json(self, url, params, headers=None, timeout=None):
+        async with self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout) as response:
+            if response.status >= 400:
+                return response.status, None
+            return response.status, await self._read_json(response)
+
     async def post_text(self, url, data, headers=None, timeout=None):
         async with self.session.post(url, data=data, headers=headers, timeout=timeout or self.timeout) as response:
             return response.status, await response.text(), response.real_url
 
+    async def post_files(self, url, files, headers=None, timeout=None):
+        data = aiohttp.FormData()
+        opened = []
+        try:
+            for field, file in files.items():
+                filename = None
+                if isinstance(file, tuple):
+                    filename, file = file
+                if isinstance(file, (str, os.PathLike)):
+                    filename = filename or os.path.basename(file)
+                    file = open(file, 'rb')
+                    opened.append(file)
+                # Content of the file is streamed by aiohttp payload
+                data.add_field(field, file, filename=filename or field)
+            async with self.session.post(url, data=data, headers=headers,
+                                         timeout=self._stream_timeout(timeout)) as response:
+                return response.status, await self._read_json(response)
+        finally:
+            for file in opened:
+                file.close()
+
+    async def warm_up(self, urls=None, connections=4):
+        """
+        Opens connections before the first requests, so they don't wait for DNS, TCP and TLS handshakes.
+        Connections are opened by concurrent GET requests without redirects and stay in the pool of the http session.
+        HEAD requests are not used because aiohttp does not return their connections to the pool
+
+        :param urls: urls of hosts, `HttpDriver.WARM_UP_URLS` by default
+        :param connections: number of connections to each host
+        :return: number of open connections
+        """
+        urls = self.WARM_UP_URLS if urls is None else urls
+        results = await asyncio.gather(
+            *(self._ping(url) for url in urls for _ in range(connections)),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    async def _ping(self, url):
+        async with self.session.get(url, allow_redirects=False, timeout=self.timeout) as response:
+            await response.read()
+
+    def start_keep_alive(self, interval=10, urls=None, connections=4):
+        """
+        Repeats warm up in background, so idle connections are not closed by keep-alive timeout.
+        It is stopped when the driver is closed
+
+        :param interval: time in seconds between warm ups, it must be less than keep-alive timeout of connections
+        """
+        if self._keep_alive is None:
+            self._keep_alive = asyncio.ensure_future(self._keep_alive_loop(interval, urls, connections))
+
+    async def stop_keep_alive(self):
+        if self._keep_alive is not None:
+            task, self._keep_alive = self._keep_alive, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _keep_alive_loop(self, interval, urls, connections):
+        while True:
+            await asyncio.sleep(interval)
+            await self.warm_up(urls, connections)
+
+    def _create_long_poll_connector(self):
+        return aiohttp.TCPConnector(limit=self.long_poll_limit)
+
+    def get_long_poll_driver(self):
+        """
+        Returns driver with its own connection pool, it is closed with this driver.
+        If http session was passed to this driver, long poll driver uses it too.
+        Mixins of this driver, e.g. retries, are not applied to long poll requests
+        """
+        if self._long_poll_driver is None:
+            if self._shared_long_poll_session:
+                session = self.session
+            else:
+                session = aiohttp.ClientSession(connector=self._create_long_poll_connector())
+            self._long_poll_driver = HttpDriver(self.timeout, session=session, json_codec=self.json_codec)
+        return self._long_poll_driver
+
+    async def _close_long_poll_driver(self):
+        if self._long_poll_driver is not None:
+            if self._long_poll_driver.session is not self.session:
+                await self._long_poll_driver.close()
+            self._long_poll_driver = None
+
     async def close(self):
+        await self.stop_keep_alive()
         await self.session.close()
+        await self._close_long_poll_driver()
 
 
 class ProxyDriver(HttpDriver):
     connector = ProxyConnector
 
-    def __init__(self, address, port, login=None, password=None, timeout=10, **kwargs):
-        connector = ProxyConnector(
-            host=address,
-            port=port,
-            username=login,
-            password=password,
-            **kwargs
-        )
+    def __init__(self, address, port, login=None, password=None, timeout=10, json_codec=None, **kwargs):
+        self._proxy_args = dict(host=address, port=port, username=login, password=password, **kwargs)
+        connector = ProxyConnector(**self._proxy_args)
         session = aiohttp.ClientSession(connector=connector)
-        super().__init__(timeout, kwargs.get('loop'), session)
+        super().__init__(timeout, kwargs.get('loop'), session, json_codec)
+        # Long poll connector is created with the same proxy
+        self._shared_long_poll_session = False
+
+    def _create_long_poll_connector(self):
+        return ProxyConnector(limit=self.long_poll_limit, **self._proxy_args)
+
+
+class SharedHttpDriver(HttpDriver):
+    """Driver that uses http session of `DriverRegistry`, closing of the driver releases the http session"""
+
+    def __init__(self, registry, timeout=10, json_codec=None):
+        """
+        :param registry: `DriverRegistry` that owns the http session
+        """
+        super().__init__(timeout, session=registry.session, json_codec=json_codec)
+        self.registry = registry
+        self._closed = False
+
+    def get_long_poll_driver(self):
+        """Returns driver with the long poll http session of the registry, it is shared by all its drivers"""
+        if self._long_poll_driver is None:
+            self._long_poll_driver = HttpDriver(
+                self.timeout, session=self.registry.get_long_poll_session(), json_codec=self.json_codec
+            )
+        return self._long_poll_driver
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            await self.stop_keep_alive()
+            # Long poll session is closed by the registry
+            self._long_poll_driver = None
+            await self.registry.release()
+
+
+class DriverRegistry:
+    """
+    Shares one http session with tuned connection pool between drivers of many sessions,
+    so they reuse warm connections. Long poll requests of all drivers share another http session.
+    Http sessions are closed when the last driver is closed
+    """
+
+    def __init__(self, limit=100, limit_per_host=0, keepalive_timeout=30, ttl_dns_cache=300, long_poll_limit=100):
+        """
+        :param limit: max number of connections
+        :param limit_per_host: max number of connections to one host, 0 for no limit
+        :param keepalive_timeout: time in seconds while idle connection is kept open
+        :param ttl_dns_cache: time in seconds while resolved addresses are cached
+        :param long_poll_limit: max number of connections of long poll requests
+        """
+        self.connector_args = {
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': keepalive_timeout,
+            'ttl_dns_cache': ttl_dns_cache,
+        }
+        self.long_poll_limit = long_poll_limit
+        self.session = None
+        self.long_poll_session = None
+        self.references = 0
+
+    def acquire(self, driver_class=SharedHttpDriver, **kwargs) -> SharedHttpDriver:
+        """
+        :param driver_class: `SharedHttpDriver` or its subclass, e.g. with `LimitRateDriverMixin`
+        :param kwargs: arguments of the driver, e.g. timeout
+        :return: new driver that uses the shared http session
+        """
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self.connector_args))
+        self.references += 1
+        return driver_class(self, **kwargs)
+
+    def get_long_poll_session(self) -> aiohttp.ClientSession:
+        """Returns http session with its own connection pool for hanging long poll requests of all drivers"""
+        if self.long_poll_session is None:
+            connector_args = dict(self.connector_args, limit=self.long_poll_limit, limit_per_host=0)
+            self.long_poll_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**connector_args))
+        return self.long_poll_session
+
+    async def release(self):
+        """Closes the shared http sessions if they are not used by any driver"""
+        self.references -= 1
+        if self.references == 0:
+            if self.session is not None:
+                session, self.session = self.session, None
+                await session.close()
+            if self.long_poll_session is not None:
+                session, self.long_poll_session = self.long_poll_session, None
+                await session.close()
@@ -0,0 +1,331 @@
+"""
+Typed events of user long poll, see https://vk.com/dev/using_longpoll
+
+Events keep the raw update and decode its fields only when they are accessed,
+so events that are skipped by code cost nothing but the code check
+"""
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+CHAT_PEER_OFFSET = 2000000000
+# Default of missing fields, it is shared by all events, so it is read-only
+EMPTY = MappingProxyType({})
+
+MESSAGE_FLAGS = {
+    1: 'unread',
+    2: 'outbox',
+    4: 'replied',
+    8: 'important',
+    16: 'chat',
+    32: 'friends',
+    64: 'spam',
+    128: 'deleted',
+    256: 'fixed',
+    512: 'media',
+    65536: 'hidden',
+    131072: 'deleted_for_all',
+    262144: 'not_delivered',
+}
+
+CONVERSATION_FLAGS = {
+    1: 'important',
+    2: 'unanswered',
+    16384: 'mentioned',
+}
+
+
+def make_flag_tables(flags: Dict[int, str]) -> Tuple[Tuple[FrozenSet[str], ...], ...]:
+    """Returns names of flags for every value of every byte of bitmask"""
+    tables = []
+    for shift in range(0, max(flags).bit_length(), 8):
+        tables.append(tuple(
+            frozenset(name for mask, name in flags.items() if (mask >> shift) & value)
+            for value in range(256)
+        ))
+    return tuple(tables)
+
+
+MESSAGE_FLAG_TABLES = make_flag_tables(MESSAGE_FLAGS)
+CONVERSATION_FLAG_TABLES = make_flag_tables(CONVERSATION_FLAGS)
+
+
+def decode_flags(value: int, tables=MESSAGE_FLAG_TABLES) -> FrozenSet[str]:
+    """Returns names of flags set in bitmask, see `make_flag_tables`"""
+    if value < 256:
+        return tables[0][value]
+    names = frozenset()
+    for table in tables:
+        if not value:
+            break
+        names |= table[value & 255]
+        value >>= 8
+    return names
+
+
+class Field:
+    """Field of event that is read from the raw update by index"""
+    __slots__ = ('index', 'default')
+
+    def __init__(self, index: int, default=None):
+        self.index = index
+        self.default = default
+
+    def __get__(self, event, owner):
+        if event is None:
+            return self
+        raw = event.raw
+        return raw[self.index] if len(raw) > self.index else self.default
+
+
+class Event:
+    """Event with unknown code, only raw update is available"""
+    __slots__ = ('raw',)
+
+    CODE = None
+    code = Field(0)
+
+    def __init__(self, raw: list):
+        self.raw = raw
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.raw!r})'
+
+
+class MessageFlagsEvent(Event):
+    __slots__ = ()
+
+    message_id = Field(1)
+    flags_value = Field(2, 0)
+    peer_id = Field(3)
+
+    @property
+    def flags(self) -> FrozenSet[str]:
+        return decode_flags(self.flags_value, MESSAGE_FLAG_TABLES)
+
+
+class MessageFlagsReplace(MessageFlagsEvent):
+    __slots__ = ()
+    CODE = 1
+
+
+class MessageFlagsSet(MessageFlagsEvent):
+    __slots__ = ()
+    CODE = 2
+
+
+class MessageFlagsReset(MessageFlagsEvent):
+    __slots__ = ()
+    CODE = 3
+
+
+class MessageNew(MessageFlagsEvent):
+    __slots__ = ()
+    CODE = 4
+
+    timestamp = Field(4)
+    text = Field(5, '')
+    extra = Field(6, EMPTY)
+    attachments = Field(7, EMPTY)
+    random_id = Field(8)
+    conversation_message_id = Field(9)
+
+    @property
+    def outbox(self) -> bool:
+        return bool(self.flags_value & 2)
+
+    @property
+    def is_chat(self) -> bool:
+        return self.peer_id > CHAT_PEER_OFFSET
+
+    @property
+    def from_id(self) -> Optional[int]:
+        """Author of the message, None for outgoing messages of dialogs, they are sent by the current user"""
+        if self.is_chat:
+            return int(self.extra.get('from', 0))
+        if self.outbox:
+            return None
+        return self.peer_id
+
+
+class MessageEdit(MessageNew):
+    __slots__ = ()
+    CODE = 5
+
+
+class ReadEvent(Event):
+    __slots__ = ()
+
+    peer_id = Field(1)
+    local_id = Field(2)
+
+
+class ReadIn(ReadEvent):
+    __slots__ = ()
+    CODE = 6
+
+
+class ReadOut(ReadEvent):
+    __slots__ = ()
+    CODE = 7
+
+
+class FriendEvent(Event):
+    __slots__ = ()
+
+    timestamp = Field(3)
+
+    @property
+    def user_id(self) -> int:
+        return -self.raw[1]
+
+
+class FriendOnline(FriendEvent):
+    __slots__ = ()
+    CODE = 8
+
+    platform = Field(2)
+
+
+class FriendOffline(FriendEvent):
+    __slots__ = ()
+    CODE = 9
+
+    is_timeout = Field(2)
+
+
+class ConversationFlagsEvent(Event):
+    __slots__ = ()
+
+    peer_id = Field(1)
+    flags_value = Field(2, 0)
+
+    @property
+    def flags(self) -> FrozenSet[str]:
+        return decode_flags(self.flags_value, CONVERSATION_FLAG_TABLES)
+
+
+class ConversationFlagsReset(ConversationFlagsEvent):
+    __slots__ = ()
+    CODE = 10
+
+
+class ConversationFlagsReplace(ConversationFlagsEvent):
+    __slots__ = ()
+    CODE = 11
+
+
+class ConversationFlagsSet(ConversationFlagsEvent):
+    __slots__ = ()
+    CODE = 12
+
+
+class MessagesDeleted(ReadEvent):
+    __slots__ = ()
+    CODE = 13
+
+
+class MessagesRestored(ReadEvent):
+    __slots__ = ()
+    CODE = 14
+
+
+class ChatChanged(Event):
+    __slots__ = ()
+    CODE = 51
+
+    chat_id = Field(1)
+    by_self = Field(2)
+
+    @property
+    def peer_id(self) -> int:
+        return CHAT_PEER_OFFSET + self.chat_id
+
+
+class ChatInfoChanged(Event):
+    __slots__ = ()
+    CODE = 52
+
+    type_id = Field(1)
+    peer_id = Field(2)
+    info = Field(3)
+
+
+class Typing(Event):
+    __slots__ = ()
+    CODE = 61
+
+    user_id = Field(1)
+    flags_value = Field(2, 0)
+
+    @property
+    def peer_id(self) -> int:
+        # Typing in dialog with the user
+        return self.user_id
+
+
+class ChatTyping(Event):
+    __slots__ = ()
+    CODE = 62
+
+    user_id = Field(1)
+    chat_id = Field(2)
+
+    @property
+    def peer_id(self) -> int:
+        return CHAT_PEER_OFFSET + self.chat_id
+
+
+class ChatTypingMany(Event):
+    __slots__ = ()
+    CODE = 63
+
+    peer_id = Field(1)
+    user_ids = Field(2, ())
+    total_count = Field(3)
+    timestamp = Field(4)
+
+
+class ChatVoiceRecording(ChatTypingMany):
+    __slots__ = ()
+    CODE = 64
+
+
+class CounterUpdate(Event):
+    __slots__ = ()
+    CODE = 80
+
+    count = Field(1)
+
+
+class NotificationSettings(Event):
+    __slots__ = ()
+    CODE = 114
+
+    settings = Field(1, EMPTY)
+
+
+EVENT_CLASSES = {
+    event_class.CODE: event_class
+    for event_class in (
+        MessageFlagsReplace, MessageFlagsSet, MessageFlagsReset, MessageNew, MessageEdit, ReadIn, ReadOut,
+        FriendOnline, FriendOffline, ConversationFlagsReset, ConversationFlagsReplace, ConversationFlagsSet,
+        MessagesDeleted, MessagesRestored, ChatChanged, ChatInfoChanged, Typing, ChatTyping, ChatTypingMany,
+        ChatVoiceRecording, CounterUpdate, NotificationSettings,
+    )
+}
+
+
+def decode(update: list) -> Event:
+    """Wraps raw update of user long poll into event of its code"""
+    return EVENT_CLASSES.get(update[0], Event)(update)
+
+
+def decode_all(updates: Iterable[list], codes: set = None):
+    """
+    Iterates over events of raw updates
+
+    :param codes: codes of events that are decoded, other updates are skipped, all by default
+    """
+    for update in updates:
+        if codes is None or update[0] in codes:
+            yield EVENT_CLASSES.get(update[0], Event)(update)
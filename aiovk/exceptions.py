@@ -3,6 +3,9 @@ from urllib.parse import urlencode
 
 CAPTCHA_IS_NEEDED = 14
 AUTHORIZATION_FAILED = 5  # invalid access token
+TOO_MANY_REQUESTS = 6  # too many requests per second
+FLOOD_CONTROL = 9  # too many similar requests
+INTERNAL_ERROR = 10  # internal server error
 
 
 class VkException(Exception):
@@ -42,6 +45,34 @@ class VkAPIError(VkException):
         self.url = url
 
 
+class VkUploadError(VkException):
+    def __init__(self, error, url):
+        self.error = error
+        self.url = url
+
+    def __str__(self):
+        return str(self.error)
+
+
+class VkCircuitOpenError(VkException):
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return "Requests to {} are stopped for {:.1f} seconds after failures".format(self.endpoint, self.retry_after)
+
+
+class VkTokensUnavailableError(VkException):
+    """All tokens of the pool are disabled after flood control or rate limit errors"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return "All tokens are temporarily disabled for {:.1f} seconds".format(self.retry_after)
+
+
 class VkLongPollError(VkException):
     def __init__(self, error, description, url='', params=''):
         self.error = error
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+from .exceptions import VkAPIError
+from .sessions import BaseSession, SessionWrapper, TokenSession
+
+
+class HedgingSession(SessionWrapper):
+    """
+    Sends a second identical request when the first one is slower than usual and returns whichever
+    answer arrives first, the other request is cancelled. The second request goes through the wrapped
+    session and its driver, so it is charged to the rate limiter as any other request. Requests are not hedged
+    while the rate limiter of the driver has no free slot, and latency doesn't include waiting for a slot
+    """
+
+    # Idempotent methods which calls may be sent twice
+    METHODS = {
+        'users.get',
+        'groups.getById',
+        'messages.getById',
+        'messages.getConversationsById',
+        'wall.getById',
+    }
+
+    def __init__(self, session: BaseSession, methods: set = None, percentile: float = 95, window: int = 200,
+                 min_samples: int = 20, initial_delay: float = 0.5, min_delay: float = 0.01):
+        """
+        :param session: wrapped session
+        :param methods: names of hedged methods, see `HedgingSession.METHODS`
+        :param percentile: second request is sent when the first one is slower than this percentile
+                           of recent latencies of the method, so about 100 - percentile % of requests are sent twice
+        :param window: number of recent latencies of every method
+        :param min_samples: number of latencies that are needed to compute the percentile
+        :param initial_delay: delay of the second request in seconds until the percentile is computed
+        :param min_delay: min delay of the second request in seconds
+        """
+        super().__init__(session)
+        self.methods = set(self.METHODS if methods is None else methods)
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.stats = Counter()
+        self._latencies = {}
+
+    def get_delay(self, method_name: str) -> float:
+        """
+        :return: time in seconds after which the second request is sent
+        """
+        latencies = self._latencies.get(method_name)
+        if latencies is None or len(latencies) < self.min_samples:
+            return self.initial_delay
+        latencies = sorted(latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return max(self.min_delay, latencies[index])
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        if method_name not in self.methods:
+            return await self.session.send_api_request(method_name, params, timeout, raw_response)
+
+        self.stats['requests'] += 1
+        # Sessions may add token and version to params, so every request gets its own copy
+        first = asyncio.ensure_future(self._send(method_name, dict(params or {}), timeout, raw_response))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.get_delay(method_name))
+            if done:
+                return first.result()
+            if self._rate_delay(method_name, params) > 0:
+                # Second request would wait for a slot and spend rate budget exactly when it is scarce
+                self.stats['throttled'] += 1
+                return await first
+
+            self.stats['hedged'] += 1
+            tasks.add(asyncio.ensure_future(self._send(method_name, dict(params or {}), timeout, raw_response)))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # Api error is an answer, but failed request is not while the other one may succeed
+                    if task.exception() is None or isinstance(task.exception(), VkAPIError):
+                        if task is not first:
+                            self.stats['won'] += 1
+                        return task.result()
+            return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _rate_delay(self, method_name: str, params: dict) -> float:
+        """Returns time in seconds that the request would wait for the rate limit of the driver"""
+        driver = getattr(self.session, 'driver', None)
+        if driver is None:
+            return 0.0
+        params = dict(params or {})
+        access_token = getattr(self.session, 'access_token', None)
+        if access_token:
+            # Drivers may limit rate of every token separately
+            params.setdefault('access_token', access_token)
+        return driver.get_rate_delay(TokenSession.REQUEST_URL + method_name, params)
+
+    async def _send(self, method_name: str, params: dict, timeout: int, raw_response: bool) -> dict:
+        # Time in the queue of the rate limiter is not a latency of the method
+        started = time.monotonic() + self._rate_delay(method_name, params)
+        try:
+            return await self.session.send_api_request(method_name, params, timeout, raw_response)
+        finally:
+            # Latency of cancelled request is its lower bound
+            latencies = self._latencies.get(method_name)
+            if latencies is None:
+                latencies = self._latencies[method_name] = deque(maxlen=self.window)
+            latencies.append(max(0.0, time.monotonic() - started))
@@ -0,0 +1,73 @@
+import json
+from typing import Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """Codec based on the standard json module, all other codecs have the same interface"""
+
+    def loads(self, data: Union[str, bytes]):
+        """
+        :param data: json document, bytes are decoded without creation of intermediate string if backend allows
+        """
+        return json.loads(data)
+
+    def dumps(self, obj) -> str:
+        """Non-ASCII characters are not escaped"""
+        return json.dumps(obj, ensure_ascii=False)
+
+
+class OrjsonCodec(JsonCodec):
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError('orjson is not installed')
+
+    def loads(self, data: Union[str, bytes]):
+        return orjson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return orjson.dumps(obj).decode()
+
+
+class UjsonCodec(JsonCodec):
+    def __init__(self):
+        if ujson is None:
+            raise RuntimeError('ujson is not installed')
+
+    def loads(self, data: Union[str, bytes]):
+        return ujson.loads(data)
+
+    def dumps(self, obj) -> str:
+        return ujson.dumps(obj, ensure_ascii=False)
+
+
+CODECS = {
+    'json': JsonCodec,
+    'orjson': OrjsonCodec,
+    'ujson': UjsonCodec,
+}
+
+
+def get_codec(codec: Union[JsonCodec, str] = None) -> JsonCodec:
+    """
+    :param codec: codec object, name of backend from `CODECS`
+                  or None for the fastest installed one, standard json module is used if nothing else is installed
+    """
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec is None:
+        if orjson is not None:
+            return OrjsonCodec()
+        if ujson is not None:
+            return UjsonCodec()
+        return JsonCodec()
+    return CODECS[codec]()
@@ -1,16 +1,22 @@
-import json
+import asyncio
+import random
 from abc import ABC, abstractmethod
+from collections import Counter
 from typing import Union, Optional
 
+import aiohttp
+
 from . import API
 from .api import LazyAPI
+from .drivers import HttpDriver
+from .events import decode_all
 from .exceptions import VkLongPollError
 
 
 class BaseLongPoll(ABC):
     """Interface for all types of Longpoll API"""
     def __init__(self, session_or_api, mode: Optional[Union[int, list]],
-                 wait: int = 25, version: int = 2, timeout: int = None):
+                 wait: int = 25, version: int = 2, timeout: int = None, driver=None):
         """
         :param session_or_api: session object or data for creating a new session
         :type session_or_api: BaseSession or API or LazyAPI
@@ -18,7 +24,10 @@ class BaseLongPoll(ABC):
         :param wait: waiting period
         :param version: protocol version
         :param timeout: timeout for *.getLongPollServer request in current session
+        :param driver: driver for long poll requests, by default the session driver
+                       provides a driver with its own connection pool
         """
+        self.driver = driver
         if isinstance(session_or_api, (API, LazyAPI)):
             self.api = session_or_api
         else:
@@ -50,10 +59,13 @@ class BaseLongPoll(ABC):
         :param need_pts: need return the pts field
         """
 
-    async def wait(self, need_pts=False) -> dict:
+    async def wait(self, need_pts=False, reconnect=True) -> dict:
         """Send long poll request
 
         :param need_pts: need return the pts field
+        :param reconnect: request the long poll server again right away when the key is expired
+                          or information is lost (failed 2 and 3), otherwise `VkLongPollError`
+                          with the code of failure is raised and the next call requests the server
         """
         if not self.base_url:
             await self._get_long_poll_server(need_pts)
@@ -63,20 +75,24 @@ class BaseLongPoll(ABC):
             'key': self.key,
         }
         params.update(self.base_params)
-        # invalid mimetype from server
-        status, response, _ = await self.api._session.driver.get_text(
+        # invalid mimetype from server, so body is decoded regardless of content type
+        driver = self.driver or self.api._session.driver.get_long_poll_driver()
+        status, response = await driver.get_json(
             self.base_url, params,
             timeout=2 * self.base_params['wait']
         )
 
-        if status == 403:
-            raise VkLongPollError(403, 'smth weth wrong', self.base_url + '/', params)
+        if status >= 400:
+            # Body of error response is not decoded
+            raise VkLongPollError(status, 'smth weth wrong', self.base_url + '/', params)
 
-        response = json.loads(response)
         failed = response.get('failed')
 
         if not failed:
             self.ts = response['ts']
+            # Returned in mode with 32 flag
+            if 'pts' in response:
+                self.pts = response['pts']
             return response
 
         if failed == 1:
@@ -89,15 +105,66 @@ class BaseLongPoll(ABC):
                 params
             )
         else:
-            self.base_url = None
+            url, self.base_url = self.base_url, None
+            if not reconnect:
+                raise VkLongPollError(
+                    failed,
+                    'The key has expired' if failed == 2 else 'The information has been lost',
+                    url + '/',
+                    params
+                )
 
-        return await self.wait()
+        return await self.wait(reconnect=reconnect)
     
-    async def iter(self):
-        while True:
-            response = await self.wait()
-            for event in response['updates']:
-                yield event
+    async def iter(self, prefetch: int = 0):
+        """
+        :param prefetch: max number of responses received ahead of the consumer. If it is positive,
+                         the next long poll request is sent while the consumer processes events,
+                         otherwise only after all events of the previous response are processed.
+                         If the iteration is stopped, the position of the long poll is returned
+                         to the last yielded response, so prefetched events are received again by the next one
+        """
+        responses = self.iter_responses(prefetch)
+        try:
+            async for response in responses:
+                for event in response['updates']:
+                    yield event
+        finally:
+            # Position is restored before the iteration is finished
+            await responses.aclose()
+
+    async def iter_responses(self, prefetch: int = 0):
+        """
+        Iterates over long poll responses, see `iter`
+        """
+        if prefetch <= 0:
+            while True:
+                yield await self.wait()
+
+        queue = asyncio.Queue(maxsize=prefetch)
+        # Position after the last yielded response
+        ts, pts = self.ts, self.pts
+        producer = asyncio.ensure_future(self._produce(queue))
+        try:
+            while True:
+                response = await queue.get()
+                if isinstance(response, _ProducerError):
+                    raise response.exception
+                ts, pts = response['ts'], response.get('pts', pts)
+                yield response
+        finally:
+            producer.cancel()
+            self.ts, self.pts = ts, pts
+
+    async def _produce(self, queue: asyncio.Queue) -> None:
+        """Sends long poll requests one after another, a full queue stops them"""
+        try:
+            while True:
+                await queue.put(await self.wait())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(_ProducerError(e))
 
     async def get_pts(self, need_ts=False):
         if not self.base_url or not self.pts:
@@ -108,6 +175,14 @@ class BaseLongPoll(ABC):
         return self.pts
 
 
+class _ProducerError:
+    """Exception of the long poll requests task that is raised in the consumer"""
+    __slots__ = ('exception',)
+
+    def __init__(self, exception: Exception):
+        self.exception = exception
+
+
 class UserLongPoll(BaseLongPoll):
     """Implements https://vk.com/dev/using_longpoll"""
     # False for testing
@@ -121,6 +196,22 @@ class UserLongPoll(BaseLongPoll):
         # fucking differences between long poll methods in vk api!
         self.base_url = f'http{"s" if self.use_https else ""}://{response["server"]}'
 
+    async def iter_events(self, codes: set = None, prefetch: int = 0):
+        """
+        Iterates over typed events, see `aiovk.events`
+
+        :param codes: codes of events, other updates are skipped without decoding, all by default
+        :param prefetch: see `BaseLongPoll.iter`
+        """
+        responses = self.iter_responses(prefetch)
+        try:
+            async for response in responses:
+                for event in decode_all(response['updates'], codes):
+                    yield event
+        finally:
+            # Position is restored before the iteration is finished
+            await responses.aclose()
+
 
 class LongPoll(UserLongPoll):
     """Implements https://vk.com/dev/using_longpoll
@@ -131,8 +222,8 @@ class LongPoll(UserLongPoll):
     
 class BotsLongPoll(BaseLongPoll):
     """Implements https://vk.com/dev/bots_longpoll"""
-    def __init__(self, session_or_api, group_id, wait=25, version=1, timeout=None):
-        super().__init__(session_or_api, None, wait, version, timeout)
+    def __init__(self, session_or_api, group_id, wait=25, version=1, timeout=None, driver=None):
+        super().__init__(session_or_api, None, wait, version, timeout, driver)
         self.group_id = group_id
 
     async def _get_long_poll_server(self, need_pts=False):
@@ -141,3 +232,93 @@ class BotsLongPoll(BaseLongPoll):
         self.ts = response['ts']
         self.key = response['key']
         self.base_url = '{}'.format(response['server'])  # Method already returning url with https://
+
+
+class LongPollMultiplexer:
+    """
+    Receives events of many long polls over one connection pool and merges them into one bounded stream
+    of `(source, event)` pairs. Failed long polls reconnect after random delays, so a failure of VK
+    does not make all of them request long poll servers at once
+    """
+
+    def __init__(self, sources, queue_size: int = 1000, driver=None, reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 60):
+        """
+        :param sources: dict of source names and long polls or list of long polls that are sources themselves
+        :param queue_size: max number of events waiting for the consumer, long polls wait for free space
+        :param driver: driver for long poll requests of all sources, by default a new one is created and closed
+                       by the multiplexer
+        :param reconnect_delay: max delay in seconds before the first reconnect, it doubles for every next one
+        :param max_reconnect_delay: max delay in seconds before any reconnect
+        """
+        if not isinstance(sources, dict):
+            sources = {long_poll: long_poll for long_poll in sources}
+        self.sources = sources
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._own_driver = driver is None
+        if driver is None:
+            # Every long poll holds one connection, so they are not limited
+            driver = HttpDriver(session=aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)))
+        self.driver = driver
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # Last exception of every source that failed
+        self.errors = {}
+        self.stats = Counter()
+        self._tasks = []
+
+    async def __aenter__(self) -> 'LongPollMultiplexer':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._receive(source, long_poll))
+                           for source, long_poll in self.sources.items()]
+
+    async def iter(self):
+        self.start()
+        while True:
+            yield await self.queue.get()
+
+    def __aiter__(self):
+        return self.iter()
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._own_driver:
+            await self.driver.close()
+
+    async def _receive(self, source, long_poll: BaseLongPoll) -> None:
+        long_poll.driver = self.driver
+        failures = 0
+        while True:
+            try:
+                response = await long_poll.wait(reconnect=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, VkLongPollError) and e.error in (2, 3):
+                    # Keys of many long polls expire at once, their servers are not requested at once
+                    self.stats['reconnects'] += 1
+                else:
+                    self.errors[source] = e
+                    self.stats['errors'] += 1
+                    failures += 1
+                # Long poll server is requested again after the delay
+                long_poll.base_url = None
+                await asyncio.sleep(random.uniform(
+                    0, min(self.max_reconnect_delay, self.reconnect_delay * 2 ** max(failures - 1, 0))
+                ))
+                continue
+            failures = 0
+            self.errors.pop(source, None)
+            for event in response['updates']:
+                await self.queue.put((source, event))
+            self.stats['events'] += len(response['updates'])
@@ -1,11 +1,26 @@
+import asyncio
+import time
+from functools import wraps
+
+import aiohttp
+from yarl import URL
+
 from .drivers import BaseDriver
-from .shaping import TaskQueue, wait_free_slot
+from .exceptions import VkCircuitOpenError
+from .shaping import CircuitBreaker, RateLimiter, RetryPolicy, wait_free_slot
 
 
 class LimitRateDriverMixin(BaseDriver):
-    def __init__(self, *args, requests_per_period=3, period=1, **kwargs):
+    def __init__(self, *args, requests_per_period=3, period=1, burst=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self._queue = TaskQueue(requests_per_period, period)
+        self._limiter = RateLimiter(requests_per_period, period, burst)
+
+    def _get_limiter(self, *args, **kwargs) -> RateLimiter:
+        """Returns limiter for the request with passed arguments"""
+        return self._limiter
+
+    def get_rate_delay(self, url=None, params=None) -> float:
+        return max(0.0, self._get_limiter(url, params).delay())
 
     @wait_free_slot
     async def post_json(self, *args, **kwargs):
@@ -20,12 +35,220 @@ class LimitRateDriverMixin(BaseDriver):
         return await super().get_text(*args, **kwargs)
 
     @wait_free_slot
+    async def get_json(self, *args, **kwargs):
+        return await super().get_json(*args, **kwargs)
+
+    @wait_free_slot
+    async def post_text(self, *args, **kwargs):
+        return await super().post_text(*args, **kwargs)
+
+
+class TokenLimitRateDriverMixin(LimitRateDriverMixin):
+    """
+    Limits rate of requests separately for each `access_token` from request params,
+    so one driver and its connection pool can serve many sessions with their own quotas.
+    Requests without a token share one common limit
+    """
+    SWEEP_SIZE = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._limiters = {}
+        self._sweep_size = self.SWEEP_SIZE
+
+    def _get_limiter(self, url=None, params=None, *args, **kwargs) -> RateLimiter:
+        token = params.get('access_token') if isinstance(params, dict) else None
+        if token is None:
+            return self._limiter
+        limiter = self._limiters.get(token)
+        if limiter is None:
+            if len(self._limiters) >= self._sweep_size:
+                self._sweep()
+            limiter = RateLimiter(self._limiter.requests_per_period, self._limiter.period, self._limiter.burst)
+            self._limiters[token] = limiter
+        return limiter
+
+    def _sweep(self) -> None:
+        """Drops limiters of tokens that have not been used for a period"""
+        now = time.monotonic()
+        for token in [token for token, limiter in self._limiters.items() if limiter.is_idle(now)]:
+            del self._limiters[token]
+        self._sweep_size = max(self.SWEEP_SIZE, 2 * len(self._limiters))
+
+
+def get_failure_reason(exc: Exception):
+    """Returns kind of transport failure for `RetryPolicy` or None if it is not transient"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return 'server_error' if exc.status >= 500 else None
+    if isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return 'connection'
+    return None
+
+
+def retry_on_failure(func):
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        idempotent = self.is_idempotent(func.__name__, *args, **kwargs)
+        retrying = self.retry_policy.start()
+        while True:
+            try:
+                result = await func(self, *args, **kwargs)
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                reason = get_failure_reason(e)
+                # Request that could reach the server is repeated only if it is idempotent
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                if reason is None or (sent and not idempotent) or not await retrying.wait(reason):
+                    raise
+                continue
+            if result[0] >= 500 and idempotent and await retrying.wait('server_error'):
+                continue
+            return result
+    return wrapper
+
+
+class RetryDriverMixin(BaseDriver):
+    """
+    Repeats requests after timeouts, connection errors and 5xx responses.
+    Api calls of methods that change data, e.g. `messages.send`, are repeated only if connection has not been
+    established, so they are never sent twice
+    """
+
+    # Api methods with these prefixes only read data, e.g. `users.get` or `groups.isMember`
+    READ_ONLY_PREFIXES = ('get', 'search', 'is', 'resolve')
+
+    def __init__(self, *args, retry_policy: RetryPolicy = None, idempotent_methods: set = None, **kwargs):
+        """
+        :param retry_policy: delays and limits of retries
+        :param idempotent_methods: names of api methods which calls are always repeated,
+                                   read-only methods by default
+        """
+        super().__init__(*args, **kwargs)
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.idempotent_methods = None if idempotent_methods is None else set(idempotent_methods)
+
+    def is_idempotent(self, request: str, url=None, *args, **kwargs) -> bool:
+        """
+        :param request: name of driver method, e.g. `post_json`
+        :param url: url of the request, api method name is its last part
+        """
+        if request.startswith('get'):
+            return True
+        if request != 'post_json' or url is None:
+            return False
+        method_name = URL(url).path.rpartition('/')[2]
+        if self.idempotent_methods is not None:
+            return method_name in self.idempotent_methods
+        return method_name.rpartition('.')[2].startswith(self.READ_ONLY_PREFIXES)
+
+    @retry_on_failure
+    async def post_json(self, *args, **kwargs):
+        return await super().post_json(*args, **kwargs)
+
+    @retry_on_failure
+    async def get_bin(self, *args, **kwargs):
+        return await super().get_bin(*args, **kwargs)
+
+    @retry_on_failure
+    async def get_text(self, *args, **kwargs):
+        return await super().get_text(*args, **kwargs)
+
+    @retry_on_failure
+    async def get_json(self, *args, **kwargs):
+        return await super().get_json(*args, **kwargs)
+
+    @retry_on_failure
+    async def post_text(self, *args, **kwargs):
+        return await super().post_text(*args, **kwargs)
+
+
+def check_circuit(func):
+    @wraps(func)
+    async def wrapper(self, url, *args, **kwargs):
+        endpoint = self._get_endpoint(url)
+        breaker = self._get_breaker(endpoint)
+        now = time.monotonic()
+        if not breaker.allow(now):
+            raise VkCircuitOpenError(endpoint, breaker.retry_after(now))
+        try:
+            result = await func(self, url, *args, **kwargs)
+        except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+            # Client errors like 4xx responses mean that the endpoint works
+            breaker.record(not isinstance(e, OSError) and get_failure_reason(e) is None)
+            raise
+        except ValueError:
+            # Body is not json, e.g. error page of proxy
+            breaker.record(False)
+            raise
+        except BaseException:
+            breaker.cancel()
+            raise
+        breaker.record(result[0] < 500)
+        return result
+    return wrapper
+
+
+class CircuitBreakerDriverMixin(BaseDriver):
+    """
+    Fails fast with `VkCircuitOpenError` while an endpoint (host and path, i.e. api method) has too many
+    timeouts, connection errors and 5xx responses, see `CircuitBreaker`.
+    Put it after `RetryDriverMixin` in bases, so every attempt is counted and open circuit stops retries
+    """
+    SWEEP_SIZE = 1024
+
+    def __init__(self, *args, circuit_breaker_args: dict = None, **kwargs):
+        """
+        :param circuit_breaker_args: arguments of `CircuitBreaker` for every endpoint
+        """
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker_args = circuit_breaker_args or {}
+        self._breakers = {}
+        self._sweep_size = self.SWEEP_SIZE
+
+    @staticmethod
+    def _get_endpoint(url) -> str:
+        url = URL(url)
+        return f'{url.host}{url.path}'
+
+    def _get_breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            if len(self._breakers) >= self._sweep_size:
+                self._sweep()
+            breaker = self._breakers[endpoint] = CircuitBreaker(**self.circuit_breaker_args)
+        return breaker
+
+    def _sweep(self) -> None:
+        """Drops breakers of endpoints without recent requests"""
+        now = time.monotonic()
+        for endpoint in [endpoint for endpoint, breaker in self._breakers.items() if breaker.is_idle(now)]:
+            del self._breakers[endpoint]
+        self._sweep_size = max(self.SWEEP_SIZE, 2 * len(self._breakers))
+
+    @check_circuit
+    async def post_json(self, *args, **kwargs):
+        return await super().post_json(*args, **kwargs)
+
+    @check_circuit
+    async def get_bin(self, *args, **kwargs):
+        return await super().get_bin(*args, **kwargs)
+
+    @check_circuit
+    async def get_text(self, *args, **kwargs):
+        return await super().get_text(*args, **kwargs)
+
+    @check_circuit
+    async def get_json(self, *args, **kwargs):
+        return await super().get_json(*args, **kwargs)
+
+    @check_circuit
     async def post_text(self, *args, **kwargs):
         return await super().post_text(*args, **kwargs)
 
-    async def close(self):
-        await super().close()
-        self._queue.cancel()
+    @check_circuit
+    async def post_files(self, *args, **kwargs):
+        return await super().post_files(*args, **kwargs)
 
 
 class SimpleImplicitSessionMixin:
@@ -1,11 +1,14 @@
 import asyncio
-import json
+import inspect
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 from . import TokenSession, API
-from .exceptions import VkAuthError
+from .drivers import DriverRegistry
+from .exceptions import VkAPIError, VkAuthError, VkException
+from .jsoncodec import JsonCodec, get_codec
+from .sessions import BaseSession, SessionWrapper
 
 
 class AsyncResult:
@@ -34,8 +37,9 @@ class VkCall:
     method_args: dict
     result: AsyncResult
 
-    def get_execute_representation(self) -> str:
-        return f"API.{self.method}({json.dumps(self.method_args, ensure_ascii=False)})"
+    def get_execute_representation(self, json_codec: JsonCodec = None) -> str:
+        json_codec = json_codec or get_codec()
+        return f"API.{self.method}({json_codec.dumps(self.method_args)})"
 
 
 class AsyncVkExecuteRequestPool:
@@ -44,8 +48,18 @@ class AsyncVkExecuteRequestPool:
     one request using `execute` method
     """
 
-    def __init__(self, call_number_per_request=25, token_session_class=TokenSession):
+    def __init__(self, call_number_per_request=25, token_session_class=TokenSession,
+                 driver_registry: DriverRegistry = None):
+        """
+        :param call_number_per_request: max number of calls in one execute request
+        :param token_session_class: class of sessions created for each token, it gets a shared driver
+                                    in the `driver` argument if it accepts one
+        :param driver_registry: registry of drivers that share one connection pool between sessions of all tokens.
+                                The default registry closes connections when every `execute` is finished,
+                                a registry with other acquired drivers keeps them open for the next executions
+        """
         self.token_session_class = token_session_class
+        self.driver_registry = DriverRegistry() if driver_registry is None else driver_registry
         self.call_number_per_request = call_number_per_request
         self.pool: Dict[str, List[VkCall]] = defaultdict(list)
         self.sessions = []
@@ -59,10 +73,10 @@ class AsyncVkExecuteRequestPool:
     async def execute(self):
         try:
             await self._execute()
-            await asyncio.gather(*[session.close() for session in self.sessions])
         finally:
             self.pool.clear()
-            self.sessions.clear()
+            sessions, self.sessions = self.sessions, []
+            await asyncio.gather(*[session.close() for session in sessions])
 
     async def _execute(self):
         """
@@ -70,7 +84,7 @@ class AsyncVkExecuteRequestPool:
         """
         executed_pools = []
         for token, calls in self.pool.items():
-            session = self.token_session_class(token)
+            session = await self._create_session(token)
             self.sessions.append(session)
             api = API(session)
 
@@ -78,6 +92,17 @@ class AsyncVkExecuteRequestPool:
                 executed_pools.append(VkExecuteMethodsPool(methods_pool).execute(api))
         await asyncio.gather(*executed_pools)
 
+    async def _create_session(self, token: str) -> BaseSession:
+        if not accepts_argument(self.token_session_class, 'driver'):
+            # Session class without driver argument creates its own driver
+            return self.token_session_class(token)
+        driver = self.driver_registry.acquire()
+        try:
+            return self.token_session_class(token, driver=driver)
+        except BaseException:
+            await driver.close()
+            raise
+
     def add_call(self, method, token, method_args=None) -> AsyncResult:
         """
         Adds an any api method call to the execute pool
@@ -104,21 +129,23 @@ class AsyncVkExecuteRequestPool:
 
 
 class VkExecuteMethodsPool:
-    def __init__(self, pool: Optional[VkCall] = None):
+    def __init__(self, pool: Optional[VkCall] = None, json_codec: JsonCodec = None):
         if not pool:
             pool = []
         self.pool: List[VkCall] = pool
+        self.json_codec = get_codec(json_codec)
 
-    async def execute(self, api: API):
+    async def execute(self, api: API, timeout: int = None):
         """
         Executes calls to the pool using the execute method and stores the results for each call
 
         :param api: API object to make the request
+        :param timeout: timeout for the execute request
         """
-        methods = [call.get_execute_representation() for call in self.pool]
+        methods = [call.get_execute_representation(self.json_codec) for call in self.pool]
         code = f"return [{','.join(methods)}];"
         try:
-            response = await api.execute(code=code, raw_response=True)
+            response = await api.execute(code=code, timeout=timeout, raw_response=True)
         except VkAuthError as e:
             for call in self.pool:
                 call.result.error = {
@@ -137,6 +164,113 @@ class VkExecuteMethodsPool:
                 call.result.result = result
 
 
+class ExecuteBatchSession(SessionWrapper):
+    """
+    Transparently groups api calls issued concurrently through the wrapped session
+    and sends each group in one request using `execute` method
+    """
+
+    def __init__(self, session: BaseSession, call_number_per_request: int = 25, delay: float = 0.01):
+        """
+        :param session: wrapped session, usually `TokenSession`
+        :param call_number_per_request: max number of calls in one execute request
+        :param delay: time in seconds during which calls are collected into a group
+        """
+        super().__init__(session)
+        self.api = API(session)
+        self.call_number_per_request = call_number_per_request
+        self.delay = delay
+        # Calls with their futures and timeouts
+        self._calls: List[Tuple[VkCall, asyncio.Future, Optional[int]]] = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        if raw_response or method_name == 'execute':
+            return await self.session.send_api_request(method_name, params, timeout, raw_response)
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        call = VkCall(method=method_name, method_args=params or {}, result=AsyncResult())
+        self._calls.append((call, future, timeout))
+        if len(self._calls) >= self.call_number_per_request:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.delay, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Sends collected calls without waiting for the end of the delay"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        calls, self._calls = self._calls, []
+        if calls:
+            task = asyncio.ensure_future(self._execute(calls))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, calls: List[Tuple[VkCall, asyncio.Future, Optional[int]]]):
+        if len(calls) == 1:
+            # There is nothing to group, execute wrapper is only an overhead
+            call, future, timeout = calls[0]
+            try:
+                result = await self.session.send_api_request(call.method, call.method_args, timeout)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        # The group waits as long as the most patient call
+        timeouts = [timeout for _, _, timeout in calls if timeout is not None]
+        timeout = max(timeouts) if timeouts else None
+        try:
+            await VkExecuteMethodsPool([call for call, _, _ in calls], self.json_codec).execute(self.api, timeout)
+        except Exception as e:
+            for _, future, _ in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        try:
+            for call, future, _ in calls:
+                if future.done():
+                    continue
+                if call.result.ok:
+                    future.set_result(call.result.result)
+                elif call.result.error is not None:
+                    # Wrapped session may be another wrapper without request url
+                    future.set_exception(VkAPIError(call.result.error, TokenSession.REQUEST_URL + call.method))
+        finally:
+            # Callers never wait forever, e.g. for calls which results are missing in the response
+            for _, future, _ in calls:
+                if not future.done():
+                    future.set_exception(VkException('Result of the call is missing in the execute response'))
+
+    async def close(self) -> None:
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().close()
+
+
+def accepts_argument(func, name: str) -> bool:
+    """Whether callable, e.g. class, accepts keyword argument by name"""
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(
+        parameter.name == name and parameter.kind != parameter.POSITIONAL_ONLY
+        or parameter.kind == parameter.VAR_KEYWORD
+        for parameter in parameters
+    )
+
+
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
     for i in range(0, len(lst), n):
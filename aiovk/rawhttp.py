@@ -0,0 +1,315 @@
+import asyncio
+import ssl
+import zlib
+from collections import defaultdict
+from urllib.parse import urlencode
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .drivers import BaseDriver
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# Methods which requests may be repeated after the server has read them
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+
+
+class HttpError(aiohttp.ClientPayloadError):
+    """Malformed response"""
+
+
+class ConnectError(aiohttp.ClientConnectorError):
+    """Connection cannot be established, so the request has not been sent"""
+
+    def __init__(self, host: str, port: int, os_error: OSError):
+        self._host = host
+        self._port = port
+        self._os_error = os_error
+        aiohttp.ClientOSError.__init__(self, os_error.errno, os_error.strerror)
+        self.args = (host, port, os_error)
+
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def ssl(self):
+        return None
+
+    def __str__(self):
+        return f'Cannot connect to host {self._host}:{self._port} [{self.strerror or self._os_error}]'
+
+
+class Connection:
+    """Keep-alive HTTP/1.1 connection, it sends one request at a time"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+        # Whether the current request is written to the socket
+        self.sent = False
+        # Whether any byte of the current response is received
+        self.received = False
+
+    async def request(self, head: bytes, body: bytes = b'', read_body: bool = True):
+        """
+        :param head: encoded request line and headers including the empty line
+        :return: http status code, dict of headers with lowercase names, body of response
+        """
+        self.sent = self.received = False
+        self.writer.write(head + body if body else head)
+        await self.writer.drain()
+        self.sent = True
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        self.received = True
+        try:
+            _, status, _ = status_line.decode('latin-1').split(' ', 2)
+            status = int(status)
+        except ValueError:
+            raise HttpError(f'Malformed status line: {status_line!r}')
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise HttpError('Connection closed in headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        if not read_body or status in (204, 304) or 100 <= status < 200:
+            return status, headers, b''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            self.reusable = False
+            data = await self.reader.read()
+        return status, headers, decompress(data, headers.get('content-encoding'))
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';', 1)[0], 16)
+            if not size:
+                # Trailer headers are skipped
+                while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+
+def decompress(data: bytes, encoding: str = None) -> bytes:
+    if encoding == 'gzip':
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            # Some servers send deflate stream without zlib header
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
+
+
+class RawHttpDriver(BaseDriver):
+    """
+    Driver with minimal overhead per request built on asyncio streams, it is designed for many small
+    requests to api.vk.com. Cookies are not supported, so authorization by login and password needs `HttpDriver`.
+    Requests are queued for free keep-alive connections, every connection sends one request at a time.
+    Failures are raised as the same aiohttp exceptions as `HttpDriver` raises, so driver mixins handle them
+    """
+
+    USER_AGENT = 'aiovk'
+    MAX_REDIRECTS = 10
+
+    def __init__(self, timeout=10, loop=None, json_codec=None, limit_per_host=100, ssl_context=None):
+        """
+        :param limit_per_host: max number of connections to one host
+        :param ssl_context: context for https connections, default one is created by default
+        """
+        super().__init__(timeout, loop, json_codec)
+        self.limit_per_host = limit_per_host
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._idle = defaultdict(list)
+        self._semaphores = defaultdict(lambda: asyncio.Semaphore(self.limit_per_host))
+        self._heads = {}
+        self._long_poll_driver = None
+        self._closed = False
+
+    async def post_json(self, url, params, headers=None, timeout=None):
+        url = URL(url)
+        status, _, data = await self.request('POST', url, urlencode(params or {}).encode(), headers, timeout)
+        return status, self._loads('POST', url, status, data)
+
+    async def get_bin(self, url, params, headers=None, timeout=None):
+        status, _, data = await self.request('GET', with_query(url, params), b'', headers, timeout)
+        return status, data
+
+    async def get_text(self, url, params, headers=None, timeout=None):
+        return await self._request_text('GET', with_query(url, params), b'', headers, timeout)
+
+    async def get_json(self, url, params, headers=None, timeout=None):
+        url = with_query(url, params)
+        status, _, data = await self.request('GET', url, b'', headers, timeout)
+        if status >= 400:
+            return status, None
+        return status, self._loads('GET', url, status, data)
+
+    async def post_text(self, url, data, headers=None, timeout=None):
+        if isinstance(data, dict):
+            data = urlencode(data)
+        return await self._request_text('POST', URL(url), (data or '').encode(), headers, timeout)
+
+    async def _request_text(self, method, url, body, headers, timeout):
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, response_headers, data = await self.request(method, url, body, headers, timeout)
+            if status not in REDIRECT_STATUSES or 'location' not in response_headers:
+                return status, data.decode(get_charset(response_headers)), url
+            url = url.join(URL(response_headers['location']))
+            if status not in (307, 308):
+                method, body = 'GET', b''
+        raise aiohttp.TooManyRedirects(get_request_info(method, url), (), status=status, message='Too many redirects')
+
+    def _loads(self, method: str, url: URL, status: int, data: bytes):
+        """Raises `aiohttp.ClientResponseError` with status of the response if its body is not json"""
+        try:
+            return self.json_codec.loads(data)
+        except ValueError:
+            raise aiohttp.ClientResponseError(
+                get_request_info(method, url), (), status=status, message='Response body is not json'
+            )
+
+    async def request(self, method: str, url: URL, body: bytes = b'', headers: dict = None, timeout=None):
+        """
+        :return: http status code, dict of headers with lowercase names, decompressed body of response
+        """
+        return await asyncio.wait_for(self._request(method, url, body, headers), timeout or self.timeout)
+
+    async def _request(self, method, url, body, headers):
+        key = (url.scheme, url.raw_host, url.port)
+        head = self._encode_head(key, method, url, body, headers)
+        async with self._semaphores[key]:
+            while True:
+                connection, reused = await self._get_connection(key)
+                try:
+                    response = await connection.request(head, body, read_body=method != 'HEAD')
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    connection.close()
+                    # Keep-alive connection may be closed by server while it was idle. The request is repeated
+                    # only if it has not been sent or it is idempotent and the server has not started to respond,
+                    # otherwise the server may have read and handled it, e.g. sent a message
+                    if reused and not connection.received and (
+                        not connection.sent or method in IDEMPOTENT_METHODS
+                    ):
+                        continue
+                    raise aiohttp.ServerDisconnectedError(str(e) or None) from e
+                except OSError as e:
+                    connection.close()
+                    raise aiohttp.ClientOSError(e.errno, e.strerror) from e
+                except ValueError as e:
+                    # Malformed chunk size or too long line
+                    connection.close()
+                    raise HttpError(str(e)) from e
+                except BaseException:
+                    connection.close()
+                    raise
+                self._release(key, connection)
+                return response
+
+    def _encode_head(self, key, method, url, body, headers):
+        # Host and fixed headers are encoded once for every endpoint
+        prefix = self._heads.get(key)
+        if prefix is None:
+            host = url.raw_host if url.is_default_port() else f'{url.raw_host}:{url.port}'
+            prefix = (
+                f' HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {self.USER_AGENT}\r\n'
+                'Accept: */*\r\nAccept-Encoding: gzip, deflate\r\nConnection: keep-alive\r\n'
+            ).encode('latin-1')
+            self._heads[key] = prefix
+        lines = [method.encode('latin-1'), b' ', url.raw_path_qs.encode('latin-1'), prefix]
+        if body:
+            lines.append(b'Content-Type: application/x-www-form-urlencoded\r\n')
+        if body or method == 'POST':
+            lines.append(b'Content-Length: %d\r\n' % len(body))
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}\r\n'.encode('latin-1'))
+        lines.append(b'\r\n')
+        return b''.join(lines)
+
+    async def _get_connection(self, key):
+        idle = self._idle[key]
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+        scheme, host, port = key
+        try:
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=self.ssl_context if scheme == 'https' else None
+            )
+        except OSError as e:
+            raise ConnectError(host, port, e) from e
+        return Connection(reader, writer), False
+
+    def _release(self, key, connection):
+        if connection.reusable and not self._closed:
+            self._idle[key].append(connection)
+        else:
+            connection.close()
+
+    def get_long_poll_driver(self):
+        """Returns driver with its own connections, it is closed with this driver"""
+        if self._long_poll_driver is None:
+            self._long_poll_driver = RawHttpDriver(
+                self.timeout, json_codec=self.json_codec,
+                limit_per_host=self.limit_per_host, ssl_context=self.ssl_context
+            )
+        return self._long_poll_driver
+
+    async def close(self):
+        self._closed = True
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+        if self._long_poll_driver is not None:
+            await self._long_poll_driver.close()
+            self._long_poll_driver = None
+
+
+def with_query(url: str, params: dict = None) -> URL:
+    url = URL(url)
+    if params:
+        url = url.update_query({name: str(value) for name, value in params.items()})
+    return url
+
+
+def get_request_info(method: str, url: URL) -> aiohttp.RequestInfo:
+    """Request info of aiohttp exceptions, request headers are not kept"""
+    return aiohttp.RequestInfo(url, method, CIMultiDictProxy(CIMultiDict()), url)
+
+
+def get_charset(headers: dict) -> str:
+    for part in headers.get('content-type', '').split(';')[1:]:
+        name, _, value = part.strip().partition('=')
+        if name.lower() == 'charset':
+            return value.strip('"') or 'utf-8'
+    return 'utf-8'
@@ -1,19 +1,26 @@
+import asyncio
 import json
+import time
 from abc import ABC, abstractmethod
-from typing import Tuple
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 from urllib.parse import parse_qsl
 
 import aiohttp.hdrs
 
 from .drivers import HttpDriver
-from .exceptions import AUTHORIZATION_FAILED, CAPTCHA_IS_NEEDED, VkAPIError, VkAuthError, VkCaptchaNeeded, \
-    VkTwoFactorCodeNeeded
+from .jsoncodec import JsonCodec, get_codec
+from .exceptions import AUTHORIZATION_FAILED, CAPTCHA_IS_NEEDED, FLOOD_CONTROL, TOO_MANY_REQUESTS, VkAPIError, \
+    VkAuthError, VkCaptchaNeeded, VkTokensUnavailableError, VkTwoFactorCodeNeeded
 from .parser import AccessPageParser, AuthPageParser, TwoFactorCodePageParser, AuthRedirectPageParser
+from .shaping import RateLimiter, RetryPolicy
 
 
 class BaseSession(ABC):
     """Interface for all types of sessions"""
 
+    json_codec: JsonCodec = get_codec()
+
     @abstractmethod
     async def __aenter__(self):
         """Make avaliable usage of "async with" context manager"""
@@ -39,21 +46,63 @@ class BaseSession(ABC):
         """
 
 
+class SessionWrapper(BaseSession):
+    """Base class for sessions that add behaviour on top of another session"""
+
+    def __init__(self, session: BaseSession):
+        """
+        :param session: wrapped session, all requests are finally sent through it
+        """
+        self.session = session
+
+    @property
+    def timeout(self):
+        return self.session.timeout
+
+    @property
+    def driver(self):
+        return self.session.driver
+
+    @property
+    def json_codec(self) -> JsonCodec:
+        return self.session.json_codec
+
+    async def __aenter__(self) -> BaseSession:
+        """Make available usage of `async with` context manager"""
+        return self
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        return await self.session.send_api_request(method_name, params, timeout, raw_response)
+
+
 class TokenSession(BaseSession):
     """Implements simple session that uses existed token for work"""
 
     API_VERSION = '5.81'
     REQUEST_URL = 'https://api.vk.com/method/'
+    # Number of request repeats after captcha or authorization errors
+    RETRIES = 2
 
-    def __init__(self, access_token: str = None, timeout: int = 10, driver=None):
+    def __init__(self, access_token: str = None, timeout: int = 10, driver=None, retry_policy: RetryPolicy = None,
+                 json_codec=None):
         """
         :param access_token: see `User Token` block from `https://vk.com/dev/access_token`
         :param timeout: default time out for any request in current session
         :param driver: TODO add description
+        :param retry_policy: policy of repeating requests after transient VK errors, requests are not repeated by default
+        :param json_codec: codec object or name of json backend, see `aiovk.jsoncodec.get_codec`.
+                           It is also passed to the default driver
         """
         self.timeout = timeout
         self.access_token = access_token
-        self.driver = HttpDriver(timeout) if driver is None else driver
+        self.json_codec = get_codec(json_codec)
+        self.driver = HttpDriver(timeout, json_codec=self.json_codec) if driver is None else driver
+        self.retry_policy = retry_policy
+        self._authorization = None
 
     async def __aenter__(self) -> BaseSession:
         """Make available usage of `async with` context manager"""
@@ -69,40 +118,62 @@ class TokenSession(BaseSession):
             timeout = self.timeout
         if not params:
             params = {}
-        if self.access_token:
-            params['access_token'] = self.access_token
         if 'v' not in params:
             params['v'] = self.API_VERSION
 
-        # Send request
-        _, response = await self.driver.post_json(self.REQUEST_URL + method_name, params, timeout=timeout)
+        retrying = self.retry_policy.start() if self.retry_policy else None
+        attempt = 0
+        while True:
+            access_token = self.access_token
+            if access_token:
+                params['access_token'] = access_token
+
+            # Send request
+            _, response = await self.driver.post_json(self.REQUEST_URL + method_name, params, timeout=timeout)
+
+            # Process response
+            # Checking the section with errors
+            error = response.get('error')
+            if not error:
+                if raw_response:
+                    return response
+                # Return only useful data
+                return response['response']
 
-        # Process response
-        # Checking the section with errors
-        error = response.get('error')
-        if error:
             err_code = error.get('error_code')
-            if err_code == CAPTCHA_IS_NEEDED:
+            if err_code == CAPTCHA_IS_NEEDED and attempt < self.RETRIES:
                 # Collect information about Captcha
                 captcha_sid = error.get('captcha_sid')
                 captcha_url = error.get('captcha_img')
                 params['captcha_key'] = await self.enter_captcha(captcha_url, captcha_sid)
                 params['captcha_sid'] = captcha_sid
-                # Send request again
-                # Provide one attempt to repeat the request
-                return await self.send_api_request(method_name, params, timeout, raw_response)
-            elif err_code == AUTHORIZATION_FAILED:
-                await self.authorize()
-                # Send request again
-                # Provide one attempt to repeat the request
-                return await self.send_api_request(method_name, params, timeout, raw_response)
-            else:
+                attempt += 1
+            elif err_code == AUTHORIZATION_FAILED and attempt < self.RETRIES:
+                await self._refresh_token(access_token)
+                attempt += 1
+            elif retrying is None or not await retrying.wait(err_code):
                 # Other errors is not related with security
                 raise VkAPIError(error, self.REQUEST_URL + method_name)
-        if raw_response:
-            return response
-        # Return only useful data
-        return response['response']
+
+    async def _refresh_token(self, failed_token: str) -> None:
+        """
+        Runs one authorization for all requests that failed with the same token
+
+        :param failed_token: token the request was sent with
+        """
+        if self.access_token != failed_token:
+            # Token has already been refreshed after the request was sent
+            return
+        if self._authorization is None:
+            self._authorization = asyncio.ensure_future(self.authorize())
+            self._authorization.add_done_callback(self._authorization_done)
+        await asyncio.shield(self._authorization)
+
+    def _authorization_done(self, task: asyncio.Future) -> None:
+        self._authorization = None
+        if not task.cancelled():
+            # Mark exception as retrieved even if all waiters were cancelled
+            task.exception()
 
     async def authorize(self) -> None:
         """Getting a new token from server"""
@@ -131,7 +202,8 @@ class ImplicitSession(TokenSession):
     AUTH_URL = 'https://oauth.vk.com/authorize'
 
     def __init__(self, login: str, password: str, app_id: int, scope: str or int or list = None,
-                 timeout: int = 10, num_of_attempts: int = 5, driver=None):
+                 timeout: int = 10, num_of_attempts: int = 5, driver=None, retry_policy: RetryPolicy = None,
+                 json_codec=None):
         """
         :param login: user login
         :param password: user password
@@ -140,8 +212,11 @@ class ImplicitSession(TokenSession):
         :param timeout: default time out for any request in current session
         :param num_of_attempts: number of authorization attempts
         :param driver: TODO add description
+        :param retry_policy: policy of repeating requests after transient VK errors
+        :param json_codec: codec object or name of json backend
         """
-        super().__init__(access_token=None, timeout=timeout, driver=driver)
+        super().__init__(access_token=None, timeout=timeout, driver=driver, retry_policy=retry_policy,
+                         json_codec=json_codec)
         self.login = login
         self.password = password
         self.app_id = app_id
@@ -312,7 +387,8 @@ class AuthorizationCodeSession(TokenSession):
     """
     CODE_URL = 'https://oauth.vk.com/access_token'
 
-    def __init__(self, app_id: int, app_secret: str, redirect_uri: str, code: str, timeout: int = 10, driver=None):
+    def __init__(self, app_id: int, app_secret: str, redirect_uri: str, code: str, timeout: int = 10, driver=None,
+                 retry_policy: RetryPolicy = None, json_codec=None):
         """
         :param app_id: application id. More details in `Application registration` block in `https://vk.com/dev/first_guide`
         :param app_secret: application secure key. See https://vk.com/editapp?id={app_id}&section=options
@@ -320,8 +396,11 @@ class AuthorizationCodeSession(TokenSession):
         :param code: See `https://vk.com/dev/authcode_flow_user`
         :param timeout:default time out for any request in current session
         :param driver: TODO add description
+        :param retry_policy: policy of repeating requests after transient VK errors
+        :param json_codec: codec object or name of json backend
         """
-        super().__init__(access_token=None, timeout=timeout, driver=driver)
+        super().__init__(access_token=None, timeout=timeout, driver=driver, retry_policy=retry_policy,
+                         json_codec=json_codec)
         self.code = code
         self.app_id = app_id
         self.app_secret = app_secret
@@ -344,3 +423,132 @@ class AuthorizationCodeSession(TokenSession):
     async def get_code(self, code: str = None) -> str:
         """Get temporary code from external sources"""
         return code or self.code
+
+
+@dataclass
+class TokenState:
+    access_token: str
+    limiter: RateLimiter
+    disabled_until: float = 0
+    # Code of the error that disabled the token
+    disabled_by: Optional[int] = None
+
+
+class TokenPoolSession(BaseSession):
+    """
+    Implements session that spreads requests across several existed tokens.
+    Each token has its own rate limit, tokens that failed authorization
+    or hit flood control are not used for a while
+    """
+
+    API_VERSION = TokenSession.API_VERSION
+    REQUEST_URL = TokenSession.REQUEST_URL
+
+    def __init__(self, access_tokens: List[str], timeout: int = 10, driver=None,
+                 requests_per_period: int = 3, period: float = 1,
+                 auth_failure_timeout: float = 600, flood_control_timeout: float = 60,
+                 max_disabled_wait: float = 5, retry_policy: RetryPolicy = None, json_codec=None):
+        """
+        :param access_tokens: list of group, service or user tokens for the same workload
+        :param timeout: default time out for any request in current session
+        :param driver: driver shared by all tokens
+        :param requests_per_period: requests limit of each token
+        :param period: period of requests limit in seconds
+        :param auth_failure_timeout: time in seconds while token is not used after authorization error
+        :param flood_control_timeout: time in seconds while token is not used after flood control error
+        :param max_disabled_wait: max time in seconds that a request waits for the first token to be enabled
+                                  when all tokens are disabled, `VkTokensUnavailableError` is raised otherwise
+        :param retry_policy: policy of repeating requests after transient VK errors, requests are not repeated by default
+        :param json_codec: codec object or name of json backend, see `aiovk.jsoncodec.get_codec`.
+                           It is also passed to the default driver
+        """
+        if not access_tokens:
+            raise ValueError('access_tokens must not be empty')
+        self.timeout = timeout
+        self.json_codec = get_codec(json_codec)
+        self.driver = HttpDriver(timeout, json_codec=self.json_codec) if driver is None else driver
+        self.tokens = [TokenState(token, RateLimiter(requests_per_period, period)) for token in access_tokens]
+        self.auth_failure_timeout = auth_failure_timeout
+        self.flood_control_timeout = flood_control_timeout
+        self.max_disabled_wait = max_disabled_wait
+        self.retry_policy = retry_policy
+        self._next = 0
+
+    async def __aenter__(self) -> BaseSession:
+        """Make available usage of `async with` context manager"""
+        return self
+
+    def _choose_token(self) -> Optional[TokenState]:
+        """Returns available token with the nearest free slot, ties are broken in round-robin order"""
+        now = time.monotonic()
+        chosen, chosen_slot = None, None
+        for i in range(len(self.tokens)):
+            state = self.tokens[(self._next + i) % len(self.tokens)]
+            if state.disabled_until > now:
+                continue
+            slot = state.limiter.next_slot(now)
+            if chosen is None or slot < chosen_slot:
+                chosen, chosen_slot = state, slot
+        self._next = (self._next + 1) % len(self.tokens)
+        return chosen
+
+    async def send_api_request(self, method_name: str, params: dict = None, timeout: int = None,
+                               raw_response: bool = False) -> dict:
+        # Prepare request
+        if not timeout:
+            timeout = self.timeout
+        params = dict(params or {})
+        if 'v' not in params:
+            params['v'] = self.API_VERSION
+
+        retrying = self.retry_policy.start() if self.retry_policy else None
+        error = None
+        # Every token may fail once
+        failures = 0
+        while failures < len(self.tokens):
+            state = self._choose_token()
+            if state is None:
+                await self._wait_for_token()
+                continue
+            await state.limiter.acquire()
+            params['access_token'] = state.access_token
+
+            # Send request
+            _, response = await self.driver.post_json(self.REQUEST_URL + method_name, params, timeout=timeout)
+
+            # Process response
+            error = response.get('error')
+            if not error:
+                if raw_response:
+                    return response
+                return response['response']
+
+            err_code = error.get('error_code')
+            if err_code == AUTHORIZATION_FAILED:
+                disabled_for = self.auth_failure_timeout
+            elif err_code == FLOOD_CONTROL:
+                disabled_for = self.flood_control_timeout
+            elif err_code == TOO_MANY_REQUESTS:
+                # Token is used somewhere else, give its quota time to recover
+                disabled_for = state.limiter.period
+            elif retrying is None or not await retrying.wait(err_code):
+                raise VkAPIError(error, self.REQUEST_URL + method_name)
+            else:
+                continue
+            state.disabled_until = time.monotonic() + disabled_for
+            state.disabled_by = err_code
+            failures += 1
+
+        raise VkAPIError(error, self.REQUEST_URL + method_name)
+
+    async def _wait_for_token(self) -> None:
+        """Waits for the first disabled token if it is enabled soon"""
+        if all(state.disabled_by == AUTHORIZATION_FAILED for state in self.tokens):
+            raise VkAuthError('no_tokens', 'All tokens failed authorization')
+        delay = min(state.disabled_until for state in self.tokens) - time.monotonic()
+        if delay > self.max_disabled_wait:
+            raise VkTokensUnavailableError(delay)
+        await asyncio.sleep(max(delay, 0))
+
+    async def close(self):
+        return await self.driver.close()
@@ -1,8 +1,20 @@
 import asyncio
+import random
+import time
+import warnings
+from collections import Counter, deque
+from typing import Optional
+
+from .exceptions import FLOOD_CONTROL, INTERNAL_ERROR, TOO_MANY_REQUESTS
 
 
 class TaskQueue(asyncio.Queue):
+    """
+    Deprecated, it is not used by drivers anymore and will be removed, use `RateLimiter` instead
+    """
+
     def __init__(self, max_size, period, *args, **kwargs):
+        warnings.warn('TaskQueue is deprecated, use RateLimiter instead', DeprecationWarning, stacklevel=2)
         super().__init__(max_size, *args, **kwargs)
         self.period = period
 
@@ -22,8 +34,261 @@ class TaskQueue(asyncio.Queue):
         self.task.cancel()
 
 
+class RateLimiter:
+    """
+    Computes the next free slot from timestamps of granted requests, so no background task is needed.
+
+    Requests are spaced by `period / requests_per_period` with up to `burst` of them at once (GCRA),
+    and no window of `period` seconds contains more than `requests_per_period` requests
+    """
+
+    def __init__(self, requests_per_period: int, period: float, burst: int = None):
+        """
+        :param requests_per_period: max number of requests in any window of `period` seconds
+        :param period: window length in seconds
+        :param burst: max number of requests sent at once, `requests_per_period` by default
+        """
+        if burst is None:
+            burst = requests_per_period
+        if not 0 < burst <= requests_per_period:
+            raise ValueError('burst must be between 1 and requests_per_period')
+        self.requests_per_period = requests_per_period
+        self.period = period
+        self.burst = burst
+        self._interval = period / requests_per_period
+        self._tolerance = (burst - 1) * self._interval
+        # Theoretical arrival time of the next request
+        self._tat = 0.0
+        # Evenly spaced requests can't exceed the window, so timestamps are needed only for bursts
+        self._granted = deque(maxlen=requests_per_period) if burst > 1 else None
+
+    def next_slot(self, now: float = None) -> float:
+        """Returns monotonic time of the nearest slot available for a request"""
+        if now is None:
+            now = time.monotonic()
+        slot = max(now, self._tat - self._tolerance)
+        if self._granted is not None and len(self._granted) == self._granted.maxlen:
+            slot = max(slot, self._granted[0] + self.period)
+        return slot
+
+    def delay(self) -> float:
+        """Returns time in seconds to wait for a free slot"""
+        now = time.monotonic()
+        return self.next_slot(now) - now
+
+    def reserve(self, now: float = None) -> float:
+        """Takes the nearest free slot and returns time in seconds to wait for it"""
+        if now is None:
+            now = time.monotonic()
+        slot = self.next_slot(now)
+        self._tat = max(self._tat, slot) + self._interval
+        if self._granted is not None:
+            self._granted.append(slot)
+        return slot - now
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def is_idle(self, now: float = None) -> bool:
+        """Returns True if the limiter state is the same as a new one has"""
+        if now is None:
+            now = time.monotonic()
+        if self._tat > now:
+            return False
+        return not self._granted or self._granted[-1] + self.period <= now
+
+
 def wait_free_slot(func):
     async def wrapper(self, *args, **kwargs):
-        await self._queue.get()
+        await self._get_limiter(*args, **kwargs).acquire()
         return await func(self, *args, **kwargs)
     return wrapper
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter and a limit of retries for each kind of failure.
+    Kinds of failure are VK error codes and `timeout`, `connection`, `server_error` for transport failures
+    """
+    RETRIES = {
+        'timeout': 2,
+        'connection': 3,
+        'server_error': 3,
+        TOO_MANY_REQUESTS: 5,
+        FLOOD_CONTROL: 2,
+        INTERNAL_ERROR: 3,
+    }
+
+    def __init__(self, retries: dict = None, base_delay: float = 0.5, max_delay: float = 10,
+                 deadline: float = None):
+        """
+        :param retries: max number of retries for each kind of failure, see `RetryPolicy.RETRIES`
+        :param base_delay: max delay in seconds before the first retry, it doubles for every next one
+        :param max_delay: max delay in seconds before any retry
+        :param deadline: time in seconds since the first attempt after which the request is not retried
+        """
+        self.retries = dict(self.RETRIES if retries is None else retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        # Number of made retries for each kind of failure
+        self.stats = Counter()
+
+    def get_delay(self, reason, attempt: int, started: float) -> Optional[float]:
+        """
+        :param reason: kind of failure
+        :param attempt: number of retries already made for this kind of failure
+        :param started: monotonic time of the first attempt
+        :return: time in seconds to wait before the next attempt or None if it must not be made
+        """
+        if attempt >= self.retries.get(reason, 0):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if self.deadline is not None and time.monotonic() + delay - started > self.deadline:
+            return None
+        return delay
+
+    def start(self) -> 'Retrying':
+        """Returns retries state for a new request"""
+        return Retrying(self)
+
+
+class Retrying:
+    """Retries state of one request"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.started = time.monotonic()
+        self.attempts = Counter()
+
+    async def wait(self, reason) -> bool:
+        """
+        Waits before the next attempt
+
+        :param reason: kind of failure
+        :return: False if the request must not be retried
+        """
+        delay = self.policy.get_delay(reason, self.attempts[reason], self.started)
+        if delay is None:
+            return False
+        self.attempts[reason] += 1
+        self.policy.stats[reason] += 1
+        await asyncio.sleep(delay)
+        return True
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a failing endpoint. The circuit opens when the rate of failures in the recent window
+    exceeds the threshold, after `open_timeout` a few probe requests are allowed (half-open state),
+    their success closes the circuit and a failure opens it again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate: float = 0.5, min_requests: int = 20, window: int = 30,
+                 open_timeout: float = 30, probes: int = 1):
+        """
+        :param failure_rate: share of failed requests that opens the circuit
+        :param min_requests: min number of requests in the window to compute the rate of failures
+        :param window: length of the window in seconds
+        :param open_timeout: time in seconds while requests are not allowed after the circuit is opened
+        :param probes: number of successful requests in half-open state that close the circuit
+        """
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_timeout = open_timeout
+        self.probes = probes
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        # Numbers of requests and failures for every second of the window
+        self._buckets = deque()
+        self._requests = 0
+        self._failures = 0
+        self._probes_in_flight = 0
+        self._probes_succeeded = 0
+
+    def allow(self, now: float = None) -> bool:
+        """Returns True if the request may be sent, the request must be finished by `record` or `cancel`"""
+        if now is None:
+            now = time.monotonic()
+        if self.state == self.OPEN:
+            if now < self.opened_at + self.open_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_succeeded = 0
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight + self._probes_succeeded >= self.probes:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def retry_after(self, now: float = None) -> float:
+        """Returns time in seconds until the next request is allowed"""
+        if now is None:
+            now = time.monotonic()
+        if self.state == self.OPEN:
+            return max(0.0, self.opened_at + self.open_timeout - now)
+        return 0.0
+
+    def record(self, success: bool, now: float = None) -> None:
+        """Records result of the allowed request"""
+        if now is None:
+            now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not success:
+                self._open(now)
+            else:
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.probes:
+                    self._close()
+            return
+        if self.state == self.OPEN:
+            # Request was allowed before the circuit has been opened
+            return
+
+        self._expire(now)
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][1] += 1
+        self._requests += 1
+        if not success:
+            self._buckets[-1][2] += 1
+            self._failures += 1
+            if self._requests >= self.min_requests and self._failures >= self.failure_rate * self._requests:
+                self._open(now)
+
+    def cancel(self) -> None:
+        """Finishes the allowed request without result, e.g. after cancellation"""
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def is_idle(self, now: float = None) -> bool:
+        """Returns True if the breaker state is the same as a new one has"""
+        if now is None:
+            now = time.monotonic()
+        self._expire(now)
+        return self.state == self.CLOSED and not self._buckets
+
+    def _expire(self, now: float) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            _, requests, failures = self._buckets.popleft()
+            self._requests -= requests
+            self._failures -= failures
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+
+    def _close(self) -> None:
+        self.state = self.CLOSED
+        self._buckets.clear()
+        self._requests = 0
+        self._failures = 0
@@ -0,0 +1,112 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List
+
+from .api import API
+from .cache import TTLCache, make_request_key
+from .exceptions import VkUploadError
+from .pools import AsyncResult, VkCall, VkExecuteMethodsPool, chunks
+
+
+@dataclass
+class UploadType:
+    server_method: str
+    field: str
+    save_method: str
+
+
+UPLOAD_TYPES: Dict[str, UploadType] = {
+    'message_photo': UploadType('photos.getMessagesUploadServer', 'photo', 'photos.saveMessagesPhoto'),
+    'message_doc': UploadType('docs.getMessagesUploadServer', 'file', 'docs.save'),
+    'wall_photo': UploadType('photos.getWallUploadServer', 'photo', 'photos.saveWallPhoto'),
+    'doc': UploadType('docs.getUploadServer', 'file', 'docs.save'),
+}
+
+
+class Uploader:
+    """
+    Uploads files in three steps: gets upload server, sends the file to it and saves the file.
+    Upload servers are cached, files are sent concurrently with limited parallelism
+    """
+
+    def __init__(self, api: API, concurrency: int = 4, server_ttl: float = 600, call_number_per_request: int = 25):
+        """
+        :param api: API object to make requests, its session driver sends files
+        :param concurrency: max number of files sent at once
+        :param server_ttl: time in seconds while upload server url is used
+        :param call_number_per_request: max number of save calls in one execute request
+        """
+        self.api = api
+        self.server_ttl = server_ttl
+        self.call_number_per_request = call_number_per_request
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._servers = TTLCache()
+        self._server_requests = {}
+
+    async def upload(self, upload_type: str, file, server_args: dict = None, save_args: dict = None):
+        """
+        :param upload_type: key of `UPLOAD_TYPES`
+        :param file: path, bytes, binary file object or tuple of filename and one of them
+        :param server_args: params of the method that returns upload server, e.g. `peer_id`
+        :param save_args: additional params of the method that saves the file
+        :return: response of the save method
+        """
+        uploaded = await self._send(upload_type, file, server_args)
+        return await self.api(UPLOAD_TYPES[upload_type].save_method, **dict(uploaded, **(save_args or {})))
+
+    async def upload_many(self, upload_type: str, files: list, server_args: dict = None,
+                          save_args: dict = None) -> List[AsyncResult]:
+        """
+        Sends files concurrently and saves them with `execute` requests
+
+        :return: objects that contain the result of the save method or error for each file
+        """
+        save_method = UPLOAD_TYPES[upload_type].save_method
+        uploaded = await asyncio.gather(
+            *(self._send(upload_type, file, server_args) for file in files),
+            return_exceptions=True
+        )
+
+        calls = []
+        for response in uploaded:
+            call = VkCall(method=save_method, method_args=None, result=AsyncResult())
+            if isinstance(response, Exception):
+                call.result.error = {'method': save_method, 'error_code': None, 'error_msg': str(response)}
+            else:
+                call.method_args = dict(response, **(save_args or {}))
+            calls.append(call)
+
+        pending = [call for call in calls if call.method_args is not None]
+        await asyncio.gather(*(
+            VkExecuteMethodsPool(pool, self.api._session.json_codec).execute(self.api)
+            for pool in chunks(pending, self.call_number_per_request)
+        ))
+        return [call.result for call in calls]
+
+    async def _send(self, upload_type: str, file, server_args: dict = None) -> dict:
+        """Sends the file to upload server and returns params for the save method"""
+        upload_type = UPLOAD_TYPES[upload_type]
+        url = await self._get_upload_url(upload_type, server_args or {})
+        async with self._semaphore:
+            status, response = await self.api._session.driver.post_files(url, {upload_type.field: file})
+        if status != 200 or not isinstance(response, dict) or 'error' in response:
+            # Upload server may be expired
+            self._servers.pop(make_request_key(upload_type.server_method, server_args or {}))
+            raise VkUploadError(response.get('error') if isinstance(response, dict) else status, url)
+        return response
+
+    async def _get_upload_url(self, upload_type: UploadType, server_args: dict) -> str:
+        key = make_request_key(upload_type.server_method, server_args)
+        found, url = self._servers.get(key)
+        if found:
+            return url
+
+        # Concurrent uploads wait for one request of upload server
+        request = self._server_requests.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self.api(upload_type.server_method, **server_args))
+            self._server_requests[key] = request
+            request.add_done_callback(lambda _: self._server_requests.pop(key, None))
+        response = await asyncio.shield(request)
+        self._servers.set(key, response['upload_url'], self.server_ttl)
+        return response['upload_url']
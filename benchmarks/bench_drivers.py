@@ -0,0 +1,77 @@
+"""
+Compares throughput and latency of drivers on small api requests to a local server
+
+    python benchmarks/bench_drivers.py --requests 20000 --concurrency 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiohttp import web
+
+from aiovk.drivers import HttpDriver
+from aiovk.rawhttp import RawHttpDriver
+
+RESPONSE = {'response': [{'id': 1, 'first_name': 'Pavel', 'last_name': 'Durov'}]}
+
+
+async def start_server(port):
+    async def handler(request):
+        await request.post()
+        return web.json_response(RESPONSE)
+
+    app = web.Application()
+    app.add_routes([web.post('/method/{name}', handler)])
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def bench(driver, url, requests, concurrency):
+    params = {'user_ids': 1, 'access_token': 'x' * 85, 'v': '5.131'}
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for _ in counter:
+            started = time.perf_counter()
+            await driver.post_json(url, params)
+            latencies.append(time.perf_counter() - started)
+
+    # Connections are opened before measurement
+    await asyncio.gather(*(driver.post_json(url, params) for _ in range(concurrency)))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await driver.close()
+
+    latencies.sort()
+    return {
+        'rps': requests / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+
+    runner = await start_server(args.port)
+    url = f'http://127.0.0.1:{args.port}/method/users.get'
+    try:
+        for driver_class in (HttpDriver, RawHttpDriver):
+            result = await bench(driver_class(), url, args.requests, args.concurrency)
+            print(f'{driver_class.__name__:<16} {result["rps"]:>10.0f} req/s'
+                  f'  p50 {result["p50"]:>7.2f} ms  p99 {result["p99"]:>7.2f} ms')
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
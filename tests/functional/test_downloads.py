@@ -0,0 +1,75 @@
+import asyncio
+import os
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+from aiovk.downloads import MediaDownloader
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+def requests():
+    return Counter()
+
+
+@pytest.fixture()
+async def media_server(aiohttp_server, requests):
+    async def media_handler(request):
+        name = request.match_info['name']
+        requests[name] += 1
+        await asyncio.sleep(0.01)
+        # Different urls may have the same content
+        return web.Response(body=name.split('-')[0].encode() * 1000)
+
+    app = web.Application()
+    app.add_routes([web.get('/{name}', media_handler)])
+    server = await aiohttp_server(app)
+    yield server
+
+
+async def test_fetch(media_server, requests, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}'
+    async with MediaDownloader(str(tmp_path)) as downloader:
+        paths = await downloader.fetch_many([f'{url}/a', f'{url}/a', f'{url}/b', f'{url}/a-copy'])
+        assert await downloader.read(f'{url}/a') == b'a' * 1000
+
+    assert requests == {'a': 1, 'b': 1, 'a-copy': 1}
+    assert paths[0] == paths[1] == paths[3]
+    assert downloader.stats == {'misses': 3, 'shared': 1, 'hits': 1}
+
+
+async def test_fetch_cache_lifetime(media_server, requests, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}'
+    async with MediaDownloader(str(tmp_path)) as downloader:
+        await downloader.fetch(f'{url}/a')
+    async with MediaDownloader(str(tmp_path)) as downloader:
+        await downloader.fetch(f'{url}/a')
+    assert requests == {'a': 1}
+
+
+async def test_fetch_eviction(media_server, requests, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}'
+    async with MediaDownloader(str(tmp_path), max_size=2500) as downloader:
+        path_a = await downloader.fetch(f'{url}/a')
+        await downloader.fetch(f'{url}/b')
+        await downloader.fetch(f'{url}/c')
+        assert not os.path.exists(path_a)
+        await downloader.fetch(f'{url}/a')
+    assert requests == {'a': 2, 'b': 1, 'c': 1}
+    assert downloader.stats['evicted'] == 2
+
+
+async def test_fetch_eviction_low_water(media_server, requests, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}'
+    async with MediaDownloader(str(tmp_path), max_size=3500, low_water=0.6) as downloader:
+        path_a = await downloader.fetch(f'{url}/a')
+        path_b = await downloader.fetch(f'{url}/b')
+        path_c = await downloader.fetch(f'{url}/c')
+        # Hit makes the file the most recently used one
+        await downloader.fetch(f'{url}/a')
+        path_d = await downloader.fetch(f'{url}/d')
+    assert [os.path.exists(path) for path in (path_a, path_b, path_c, path_d)] == [True, False, False, True]
+    assert downloader.stats['evicted'] == 2
@@ -1,13 +1,16 @@
+import asyncio
 import json
 
+import aiohttp
 import proxy
 import pytest
-from aiohttp import web
+from aiohttp import ClientResponseError, web
 from aiohttp.test_utils import unused_port
 from python_socks import ProxyType
 from yarl import URL
 
-from aiovk.drivers import HttpDriver, ProxyDriver
+from aiovk.drivers import DriverRegistry, HttpDriver, ProxyDriver
+from aiovk.rawhttp import RawHttpDriver
 
 pytestmark = pytest.mark.asyncio
 
@@ -38,6 +41,7 @@ def proxy_server():
     'driver_class, use_proxy',
     [
         (HttpDriver, False),
+        (RawHttpDriver, False),
         (ProxyDriver, True),
     ]
 )
@@ -60,6 +64,7 @@ async def test_post_json(simple_response_data, vk_server, proxy_server, driver_c
     'driver_class, use_proxy',
     [
         (HttpDriver, False),
+        (RawHttpDriver, False),
         (ProxyDriver, True),
     ]
 )
@@ -82,6 +87,7 @@ async def test_get_bin(simple_response_data, vk_server, proxy_server, driver_cla
     'driver_class, use_proxy',
     [
         (HttpDriver, False),
+        (RawHttpDriver, False),
         (ProxyDriver, True),
     ]
 )
@@ -105,6 +111,7 @@ async def test_get_text(simple_response_data, vk_server, proxy_server, driver_cl
     'driver_class, use_proxy',
     [
         (HttpDriver, False),
+        (RawHttpDriver, False),
         (ProxyDriver, True),
     ]
 )
@@ -126,3 +133,186 @@ async def test_post_text(simple_response_data, vk_server, proxy_server, driver_c
     assert status == 200
     assert text == json.dumps(simple_response_data)
     assert redirect_url == URL(url)
+
+
+@pytest.fixture()
+def media_data():
+    return bytes(range(256)) * 1024
+
+
+@pytest.fixture()
+async def media_server(aiohttp_server, media_data, tmp_path):
+    path = tmp_path / 'media.bin'
+    path.write_bytes(media_data)
+
+    async def media_handler(request):
+        return web.FileResponse(path)
+
+    app = web.Application()
+    app.add_routes([web.get('/media.bin', media_handler)])
+    server = await aiohttp_server(app)
+    yield server
+
+
+async def test_iter_bin(media_server, media_data):
+    url = f'http://{media_server.host}:{media_server.port}/media.bin'
+    driver = HttpDriver()
+    chunks = [chunk async for chunk in driver.iter_bin(url, {}, chunk_size=1024)]
+    await driver.close()
+
+    assert max(len(chunk) for chunk in chunks) <= 1024
+    assert b''.join(chunks) == media_data
+
+
+async def test_download(media_server, media_data, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}/media.bin'
+    path = tmp_path / 'downloaded.bin'
+    driver = HttpDriver()
+    status, written = await driver.download(url, path)
+    await driver.close()
+
+    assert status == 200
+    assert written == len(media_data)
+    assert path.read_bytes() == media_data
+
+
+async def test_download_resume(media_server, media_data, tmp_path):
+    url = f'http://{media_server.host}:{media_server.port}/media.bin'
+    path = tmp_path / 'downloaded.bin'
+    path.write_bytes(media_data[:1000])
+    driver = HttpDriver()
+    status, written = await driver.download(url, path, resume=True)
+    await driver.close()
+
+    assert status == 206
+    assert written == len(media_data) - 1000
+    assert path.read_bytes() == media_data
+
+
+async def test_post_files(media_data, tmp_path, aiohttp_server):
+    async def upload_handler(request):
+        data = await request.post()
+        return web.json_response({
+            name: {'filename': field.filename, 'size': len(field.file.read())} for name, field in data.items()
+        })
+
+    app = web.Application()
+    app.add_routes([web.post('/upload', upload_handler)])
+    server = await aiohttp_server(app)
+    url = f'http://{server.host}:{server.port}/upload'
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(media_data)
+
+    driver = HttpDriver()
+    status, jsn = await driver.post_files(url, {'photo': path, 'file': ('doc.txt', b'text')})
+    await driver.close()
+
+    assert status == 200
+    assert jsn == {
+        'photo': {'filename': 'photo.jpg', 'size': len(media_data)},
+        'file': {'filename': 'doc.txt', 'size': 4},
+    }
+
+
+async def test_error_page(aiohttp_server):
+    async def handler(request):
+        return web.Response(status=502, text='<html>Bad Gateway</html>', content_type='text/html')
+
+    app = web.Application()
+    app.add_routes([web.post('/method/users.get', handler)])
+    server = await aiohttp_server(app)
+    url = f'http://{server.host}:{server.port}/method/users.get'
+
+    driver = HttpDriver()
+    with pytest.raises(ClientResponseError) as exc_info:
+        await driver.post_json(url, {})
+    await driver.close()
+    assert exc_info.value.status == 502
+
+
+async def test_driver_registry(simple_response_data, vk_server):
+    url = f'http://{vk_server.host}:{vk_server.port}/'
+    registry = DriverRegistry(limit=10, limit_per_host=2)
+    drivers = [registry.acquire(timeout=5) for _ in range(3)]
+    session = registry.session
+    assert all(driver.session is session for driver in drivers)
+    assert registry.references == 3
+
+    for driver in drivers:
+        status, jsn = await driver.post_json(url, {})
+        assert status == 200
+        assert jsn == simple_response_data
+
+    long_poll_drivers = [driver.get_long_poll_driver() for driver in drivers]
+    long_poll_session = registry.long_poll_session
+    assert all(driver.session is long_poll_session for driver in long_poll_drivers)
+    assert long_poll_session is not session
+    status, jsn = await long_poll_drivers[0].get_json(url, {})
+    assert jsn == simple_response_data
+
+    await drivers[0].close()
+    await drivers[0].close()
+    await drivers[1].close()
+    assert not session.closed
+    assert not long_poll_session.closed
+    await drivers[2].close()
+    assert session.closed
+    assert long_poll_session.closed
+    assert registry.session is None
+    assert registry.long_poll_session is None
+
+
+async def test_long_poll_driver(simple_response_data, vk_server):
+    url = f'http://{vk_server.host}:{vk_server.port}/'
+    driver = HttpDriver()
+    long_poll_driver = driver.get_long_poll_driver()
+    assert long_poll_driver is driver.get_long_poll_driver()
+    assert long_poll_driver.session is not driver.session
+    assert long_poll_driver.session.connector is not driver.session.connector
+
+    status, jsn = await long_poll_driver.get_json(url, {})
+    assert status == 200
+    assert jsn == simple_response_data
+
+    await driver.close()
+    assert long_poll_driver.session.closed
+
+
+async def test_long_poll_driver_with_session(simple_response_data, vk_server):
+    url = f'http://{vk_server.host}:{vk_server.port}/'
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False))
+    driver = HttpDriver(session=session)
+    long_poll_driver = driver.get_long_poll_driver()
+    assert long_poll_driver.session is session
+
+    status, jsn = await long_poll_driver.get_json(url, {})
+    assert jsn == simple_response_data
+
+    await driver.close()
+    assert session.closed
+
+
+async def test_warm_up(aiohttp_server):
+    peers = set()
+
+    async def handler(request):
+        peers.add(request.transport.get_extra_info('peername'))
+        return web.Response()
+
+    app = web.Application()
+    app.add_routes([web.get('/', handler)])
+    server = await aiohttp_server(app)
+    url = f'http://{server.host}:{server.port}/'
+
+    driver = HttpDriver()
+    assert await driver.warm_up([url], connections=3) == 3
+    assert len(peers) == 3
+    assert await driver.warm_up([f'http://{server.host}:1/'], connections=1) == 0
+
+    driver.start_keep_alive(interval=0.01, urls=[url], connections=3)
+    await asyncio.sleep(0.05)
+    # Connections are reused
+    assert len(peers) == 3
+    task = driver._keep_alive
+    await driver.close()
+    assert task.done()
@@ -0,0 +1,218 @@
+import asyncio
+import gzip
+import re
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import unused_port
+from yarl import URL
+
+from aiovk.exceptions import VkCircuitOpenError
+from aiovk.mixins import CircuitBreakerDriverMixin, RetryDriverMixin
+from aiovk.rawhttp import RawHttpDriver
+from aiovk.shaping import RetryPolicy
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture()
+async def server(aiohttp_server):
+    peers = []
+
+    async def method(request):
+        peers.append(request.transport.get_extra_info('peername'))
+        data = await request.post()
+        return web.json_response({'response': dict(data)})
+
+    async def chunked(request):
+        response = web.StreamResponse(headers={'Content-Encoding': 'gzip'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        body = gzip.compress(b'x' * 100000)
+        await response.write(body[:1000])
+        await response.write(body[1000:])
+        await response.write_eof()
+        return response
+
+    async def redirect(request):
+        raise web.HTTPFound(location='/text?a=1')
+
+    async def text(request):
+        return web.Response(text=f'text {request.query["a"]}', charset='cp1251')
+
+    app = web.Application()
+    app.add_routes([
+        web.post('/method/{name}', method),
+        web.get('/chunked', chunked),
+        web.post('/redirect', redirect),
+        web.get('/text', text),
+    ])
+    server = await aiohttp_server(app)
+    server.peers = peers
+    yield server
+
+
+async def test_keep_alive(server):
+    url = f'http://{server.host}:{server.port}/method/users.get'
+    driver = RawHttpDriver()
+    for i in range(3):
+        status, jsn = await driver.post_json(url, {'user_ids': i, 'v': '5.74'})
+        assert status == 200
+        assert jsn == {'response': {'user_ids': str(i), 'v': '5.74'}}
+    assert len(set(server.peers)) == 1
+
+    results = await asyncio.gather(*(driver.post_json(url, {'user_ids': i}) for i in range(5)))
+    assert [jsn['response']['user_ids'] for _, jsn in results] == ['0', '1', '2', '3', '4']
+    assert len(set(server.peers)) == 5
+    await driver.close()
+
+
+async def test_connection_limit(server):
+    url = f'http://{server.host}:{server.port}/method/users.get'
+    driver = RawHttpDriver(limit_per_host=2)
+    await asyncio.gather(*(driver.post_json(url, {'user_ids': i}) for i in range(6)))
+    assert len(set(server.peers)) == 2
+    await driver.close()
+
+
+async def test_closed_idle_connection(aiohttp_server):
+    async def handler(request):
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.add_routes([web.get('/', handler)])
+    server = await aiohttp_server(app, keepalive_timeout=0.05)
+    url = f'http://{server.host}:{server.port}/'
+    driver = RawHttpDriver()
+    assert await driver.get_bin(url, {}) == (200, b'ok')
+    # Server closes idle connection
+    await asyncio.sleep(0.1)
+    assert await driver.get_bin(url, {}) == (200, b'ok')
+    await driver.close()
+
+
+@pytest.fixture()
+async def dropping_server():
+    """Server that reads the second request of every connection and closes the connection without response"""
+    bodies = []
+
+    async def handle(reader, writer):
+        requests = 0
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.IncompleteReadError:
+                break
+            length = re.search(rb'content-length: (\d+)', head.lower())
+            bodies.append(await reader.readexactly(int(length.group(1))) if length else b'')
+            requests += 1
+            if requests > 1:
+                break
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}')
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    server.bodies = bodies
+    server.port = server.sockets[0].getsockname()[1]
+    yield server
+    server.close()
+    await server.wait_closed()
+
+
+async def test_read_post_is_not_repeated(dropping_server):
+    url = f'http://127.0.0.1:{dropping_server.port}/method/messages.send'
+    driver = RawHttpDriver()
+    await driver.post_json(url, {'message': 'first'})
+    with pytest.raises(aiohttp.ServerDisconnectedError):
+        await driver.post_json(url, {'message': 'second'})
+    await driver.close()
+    assert dropping_server.bodies == [b'message=first', b'message=second']
+
+
+async def test_read_get_is_repeated(dropping_server):
+    url = f'http://127.0.0.1:{dropping_server.port}/'
+    driver = RawHttpDriver()
+    assert await driver.get_bin(url, {}) == (200, b'{}')
+    assert await driver.get_bin(url, {}) == (200, b'{}')
+    await driver.close()
+    assert len(dropping_server.bodies) == 3
+
+
+async def test_chunked_gzip(server):
+    driver = RawHttpDriver()
+    status, data = await driver.get_bin(f'http://{server.host}:{server.port}/chunked', {})
+    await driver.close()
+    assert status == 200
+    assert data == b'x' * 100000
+
+
+async def test_redirect(server):
+    driver = RawHttpDriver()
+    status, text, url = await driver.post_text(f'http://{server.host}:{server.port}/redirect', {'a': 'b'})
+    await driver.close()
+    assert status == 200
+    assert text == 'text 1'
+    assert url == URL(f'http://{server.host}:{server.port}/text?a=1')
+
+
+async def test_timeout(aiohttp_server):
+    async def handler(request):
+        await asyncio.sleep(1)
+        return web.Response()
+
+    app = web.Application()
+    app.add_routes([web.get('/', handler)])
+    server = await aiohttp_server(app)
+    driver = RawHttpDriver(timeout=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        await driver.get_bin(f'http://{server.host}:{server.port}/', {})
+    assert not driver._idle[('http', server.host, server.port)]
+    await driver.close()
+
+
+class ResilientRawHttpDriver(RetryDriverMixin, CircuitBreakerDriverMixin, RawHttpDriver):
+    pass
+
+
+async def test_mixins_error_page(aiohttp_server):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.path)
+        if len(requests) == 1:
+            return web.Response(status=502, text='<html>Bad Gateway</html>', content_type='text/html')
+        return web.json_response({'response': 1})
+
+    app = web.Application()
+    app.add_routes([web.post('/method/{name}', handler)])
+    server = await aiohttp_server(app)
+    driver = ResilientRawHttpDriver(retry_policy=RetryPolicy(base_delay=0.001))
+    status, jsn = await driver.post_json(f'http://{server.host}:{server.port}/method/users.get', {})
+    await driver.close()
+    assert (status, jsn) == (200, {'response': 1})
+    assert len(requests) == 2
+
+
+async def test_mixins_connection_failures():
+    url = f'http://127.0.0.1:{unused_port()}/method/messages.send'
+    driver = ResilientRawHttpDriver(
+        retry_policy=RetryPolicy(retries={'connection': 1}, base_delay=0.001),
+        circuit_breaker_args={'min_requests': 2, 'open_timeout': 10}
+    )
+    # Connection is not established, so even not idempotent call is retried
+    with pytest.raises(aiohttp.ClientConnectorError):
+        await driver.post_json(url, {'message': 'text'})
+    with pytest.raises(VkCircuitOpenError):
+        await driver.post_json(url, {'message': 'text'})
+    await driver.close()
+
+
+async def test_mixins_dropped_post(dropping_server):
+    url = f'http://127.0.0.1:{dropping_server.port}/method/messages.send'
+    driver = ResilientRawHttpDriver(retry_policy=RetryPolicy(base_delay=0.001))
+    await driver.post_json(url, {'message': 'first'})
+    with pytest.raises(aiohttp.ServerDisconnectedError):
+        await driver.post_json(url, {'message': 'second'})
+    await driver.close()
+    assert dropping_server.bodies == [b'message=first', b'message=second']
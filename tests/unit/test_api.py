@@ -1,7 +1,9 @@
+import asyncio
+
 import pytest
 
 from aiovk import API
-from aiovk.api import Request, LazyRequest, LazyAPI
+from aiovk.api import Request, LazyRequest, LazyAPI, BULK_METHODS
 from aiovk.sessions import BaseSession
 
 pytestmark = pytest.mark.asyncio
@@ -97,3 +99,121 @@ async def test_api(api, method, request_params, timeout, method_name, is_lazy):
         'method_name': method_name
     }
     assert response == expected
+
+
+class PagesSession(BaseSession):
+    TOTAL = 95
+    # Max number of items in one page
+    MAX_COUNT = 100
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=None):
+        self.requests.append(params)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        offset = int(params.get('offset', params.get('start_from', 0)))
+        count = min(int(params.get('count', 10)), self.MAX_COUNT)
+        # Later pages are returned faster than earlier ones
+        await asyncio.sleep(0.01 * (self.TOTAL - offset) / self.TOTAL)
+        self.in_flight -= 1
+        response = {'items': list(range(offset, min(offset + count, self.TOTAL)))}
+        if method_name == 'newsfeed.search':
+            if offset + count < self.TOTAL:
+                response['next_from'] = str(offset + count)
+        else:
+            response['count'] = self.TOTAL
+        return response
+
+
+@pytest.mark.parametrize(
+    'method_name, params, prefetch, requests', [
+        ('groups.getMembers', {'count': 10}, 4, 10),
+        ('groups.getMembers', {'count': 10, 'offset': 20}, 4, 8),
+        ('groups.getMembers', {}, 2, 10),
+        ('groups.getMembers', {'count': 100}, 4, 1),
+        ('newsfeed.search', {'count': 10}, 4, 10),
+    ]
+)
+async def test_request_iterate(method_name, params, prefetch, requests):
+    session = PagesSession()
+    api = API(session)
+    items = [item async for item in getattr(api, method_name).iterate(prefetch=prefetch, **params)]
+    assert items == list(range(params.get('offset', 0), PagesSession.TOTAL))
+    assert len(session.requests) == requests
+    assert session.max_in_flight <= prefetch
+
+
+async def test_request_iterate_capped_page():
+    session = PagesSession()
+    session.MAX_COUNT = 20
+    api = API(session)
+    items = [item async for item in api.wall.get.iterate(count=1000)]
+    assert items == list(range(PagesSession.TOTAL))
+    assert len(session.requests) == 5
+
+
+async def test_request_iterate_break():
+    session = PagesSession()
+    api = API(session)
+    async for item in api.groups.getMembers.iterate(count=10, prefetch=2):
+        if item == 15:
+            break
+    assert len(session.requests) <= 4
+
+
+async def test_request_iterate_list_params():
+    session = PagesSession()
+    api = API(session)
+    items = [item async for item in api.groups.getMembers.iterate(count=50, fields=['sex', 'city'])]
+    assert len(items) == PagesSession.TOTAL
+    assert all(params['fields'] == 'sex,city' for params in session.requests)
+
+
+class BulkSession(BaseSession):
+    def __init__(self):
+        self.requests = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=None):
+        self.requests.append(params)
+        ids = [int(i) for i in str(params[BULK_METHODS[method_name][0]]).split(',')]
+        assert len(ids) <= BULK_METHODS[method_name][1]
+        # Later chunks are returned faster than earlier ones
+        await asyncio.sleep(0.01 / len(self.requests))
+        if method_name == 'messages.getById':
+            return {'count': len(ids), 'items': [{'id': i} for i in ids]}
+        return [{'id': i} for i in ids]
+
+
+@pytest.mark.parametrize(
+    'method_name, ids_count, requests', [
+        ('users.get', 1, 1),
+        ('users.get', 1000, 1),
+        ('users.get', 2500, 3),
+        ('messages.getById', 250, 3),
+    ]
+)
+async def test_request_bulk_ids(method_name, ids_count, requests):
+    session = BulkSession()
+    api = API(session)
+    ids_param = BULK_METHODS[method_name][0]
+    response = await api(method_name, **{ids_param: list(range(ids_count))})
+    assert len(session.requests) == requests
+    if isinstance(response, dict):
+        assert response['count'] == ids_count
+        response = response['items']
+    assert [item['id'] for item in response] == list(range(ids_count))
+
+
+async def test_request_list_params():
+    response = await API(TestSession()).users.get(user_ids=[1, 2], fields=('sex', 'bdate'))
+    assert response['params'] == {'user_ids': '1,2', 'fields': 'sex,bdate'}
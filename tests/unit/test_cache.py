@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from aiovk.cache import CacheSession, SingleFlightSession, TTLCache, make_request_key
+from aiovk.exceptions import VkAPIError
+from aiovk.sessions import BaseSession
+
+pytestmark = pytest.mark.asyncio
+
+
+class Session(BaseSession):
+    timeout = 10
+
+    def __init__(self):
+        self.requests = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        self.requests.append((method_name, params))
+        await asyncio.sleep(0)
+        if params.get('user_ids') == -1:
+            raise VkAPIError({'error_code': 113, 'error_msg': 'Invalid user id'}, method_name)
+        if params.get('user_ids') == -2:
+            raise VkAPIError({'error_code': 10, 'error_msg': 'Internal server error'}, method_name)
+        return [params]
+
+
+async def test_request_key():
+    assert make_request_key('users.get', {'a': 1, 'b': [1, 2]}) == make_request_key('users.get', {'b': '1,2', 'a': '1'})
+    assert make_request_key('users.get', {'a': 1}) != make_request_key('users.get', {'a': 1}, raw_response=True)
+    assert make_request_key('users.get', {'a': 1}) != make_request_key('groups.getById', {'a': 1})
+
+
+async def test_ttl_cache():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1, 10)
+    cache.set('b', 2, 10)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3, 10)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    cache.set('d', 4, 0)
+    assert cache.get('d') == (False, None)
+    assert len(cache) == 1
+
+
+async def test_cache_session():
+    session = Session()
+    cache_session = CacheSession(session)
+    first = await cache_session.send_api_request('users.get', {'user_ids': 1, 'fields': 'sex'})
+    second = await cache_session.send_api_request('users.get', {'fields': 'sex', 'user_ids': '1'})
+    await cache_session.send_api_request('messages.send', {'user_ids': 1})
+    await cache_session.send_api_request('messages.send', {'user_ids': 1})
+
+    assert first is second
+    assert len(session.requests) == 3
+    assert cache_session.stats == {'hits': 1, 'misses': 1}
+
+
+@pytest.mark.parametrize(
+    'user_ids, requests', [
+        (-1, 1),
+        (-2, 2),
+    ]
+)
+async def test_cache_session_errors(user_ids, requests):
+    session = Session()
+    cache_session = CacheSession(session)
+    for _ in range(2):
+        with pytest.raises(VkAPIError):
+            await cache_session.send_api_request('users.get', {'user_ids': user_ids})
+    assert len(session.requests) == requests
+
+
+async def test_cache_session_expiration():
+    session = Session()
+    cache_session = CacheSession(session, ttl={'users.get': 0.01})
+    await cache_session.send_api_request('users.get', {'user_ids': 1})
+    await asyncio.sleep(0.02)
+    await cache_session.send_api_request('users.get', {'user_ids': 1})
+    assert len(session.requests) == 2
+
+
+async def test_single_flight_session():
+    session = Session()
+    single_flight_session = SingleFlightSession(session)
+    results = await asyncio.gather(
+        *(single_flight_session.send_api_request('users.get', {'user_ids': 1}) for _ in range(5)),
+        *(single_flight_session.send_api_request('messages.send', {'user_ids': 1}) for _ in range(2)),
+    )
+    assert all(result is results[0] for result in results[:5])
+    assert len(session.requests) == 3
+    assert single_flight_session.stats == {'requests': 1, 'shared': 4}
+
+    await single_flight_session.send_api_request('users.get', {'user_ids': 1})
+    assert len(session.requests) == 4
+
+
+async def test_single_flight_session_errors():
+    session = Session()
+    single_flight_session = SingleFlightSession(session, methods={'users.get'})
+    results = await asyncio.gather(
+        *(single_flight_session.send_api_request('users.get', {'user_ids': -2}) for _ in range(3)),
+        return_exceptions=True
+    )
+    assert all(isinstance(result, VkAPIError) for result in results)
+    assert len(session.requests) == 1
@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+
+from aiovk.checkpoint import FileCheckpointStorage, ResumableLongPoll, SqliteCheckpointStorage
+from aiovk.drivers import BaseDriver
+from aiovk.exceptions import VkAPIError
+from aiovk.longpoll import BotsLongPoll, UserLongPoll
+from aiovk.sessions import BaseSession
+
+pytestmark = pytest.mark.asyncio
+
+
+class Driver(BaseDriver):
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.params = []
+
+    async def get_text(self, url, params, headers=None, timeout=None):
+        self.params.append(dict(params))
+        return 200, json.dumps(self.responses.pop(0)), url
+
+
+class Session(BaseSession):
+    timeout = 10
+
+    def __init__(self, responses, history=None):
+        self.driver = Driver(responses)
+        self.history = list(history or [])
+        self.requests = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        self.requests.append((method_name, params))
+        if method_name == 'messages.getLongPollHistory':
+            response = self.history.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return {'key': 'key', 'server': 'server', 'ts': 100, 'pts': 1000}
+
+
+class MemoryStorage:
+    def __init__(self, states=None):
+        self.states = dict(states or {})
+        self.saves = 0
+
+    def load(self, name):
+        return self.states.get(name)
+
+    def save(self, name, state):
+        self.states[name] = state
+        self.saves += 1
+
+    def close(self):
+        pass
+
+
+async def collect(resumable, number):
+    events = []
+    async for event in resumable.iter():
+        events.append(event)
+        if len(events) == number:
+            break
+    return events
+
+
+async def test_resumable_long_poll_without_checkpoint():
+    session = Session([{'ts': 101, 'pts': 1001, 'updates': [[4, 1]]}, {'ts': 102, 'pts': 1002, 'updates': [[4, 2]]}])
+    storage = MemoryStorage()
+    resumable = ResumableLongPoll(UserLongPoll(session, mode=2), storage, flush_interval=0)
+    assert await collect(resumable, 2) == [[4, 1], [4, 2]]
+    # Checkpoint of the last response is saved after its events are processed
+    assert storage.states == {'default': {'ts': 101, 'pts': 1001}}
+    assert session.driver.params[0]['mode'] == 34
+
+
+async def test_resumable_long_poll_recovery():
+    session = Session(
+        [{'ts': 101, 'pts': 1003, 'updates': [[4, 3], [4, 4]]}, {'ts': 102, 'pts': 1004, 'updates': [[4, 5]]}],
+        history=[
+            {'history': [[4, 1], [4, 2]], 'new_pts': 1002, 'more': 1},
+            {'history': [[4, 3]], 'new_pts': 1003, 'more': 0},
+        ]
+    )
+    storage = MemoryStorage({'bot': {'ts': 50, 'pts': 900}})
+    resumable = ResumableLongPoll(UserLongPoll(session, mode=2), storage, name='bot', flush_interval=3600)
+    assert await collect(resumable, 5) == [[4, 1], [4, 2], [4, 3], [4, 4], [4, 5]]
+
+    history_requests = [params for method, params in session.requests if method == 'messages.getLongPollHistory']
+    assert history_requests == [{'ts': 50, 'pts': 900}, {'ts': 50, 'pts': 1002}]
+    assert session.driver.params[0]['ts'] == 100
+    assert resumable.stats == {'recovered': 3, 'duplicates': 1}
+
+    assert storage.saves == 0
+    resumable.close()
+    assert storage.states['bot'] == {'ts': 101, 'pts': 1003}
+
+
+async def test_resumable_long_poll_recovery_messages():
+    long_poll_event = [4, 3, 1, 2000000001, 1500000002, 'third', {'from': '7'}, {}]
+    session = Session(
+        [{'ts': 101, 'pts': 1003, 'updates': [long_poll_event, [4, 4, 1, 5, 1500000003, 'fourth', {}, {}]]}],
+        history=[{
+            'history': [[4, 2, 1, 2000000001], [4, 3, 1, 2000000001], [2, 2, 128, 2000000001]],
+            'messages': {'count': 2, 'items': [
+                {'id': 2, 'peer_id': 2000000001, 'from_id': 7, 'date': 1500000001, 'text': 'second',
+                 'random_id': 0, 'conversation_message_id': 20,
+                 'attachments': [{'type': 'photo', 'photo': {'id': 10, 'owner_id': 7}}]},
+                {'id': 3, 'peer_id': 2000000001, 'from_id': 7, 'date': 1500000002, 'text': 'third'},
+            ]},
+            'new_pts': 1003,
+        }]
+    )
+    storage = MemoryStorage({'default': {'ts': 50, 'pts': 900}})
+    resumable = ResumableLongPoll(UserLongPoll(session, mode=2), storage)
+    events = await collect(resumable, 4)
+    assert events[0] == [
+        4, 2, 1, 2000000001, 1500000001, 'second', {'from': '7'}, {'attach1_type': 'photo', 'attach1': '7_10'},
+        0, 20
+    ]
+    assert events[1][:6] == [4, 3, 1, 2000000001, 1500000002, 'third']
+    assert events[2] == [2, 2, 128, 2000000001]
+    # Long poll event of the recovered message is skipped although its fields differ
+    assert events[3][:2] == [4, 4]
+    assert resumable.stats == {'recovered': 3, 'duplicates': 1}
+
+
+async def test_resumable_long_poll_prefetch_stop():
+    session = Session([
+        {'ts': 101, 'pts': 1001, 'updates': [[4, 1]]},
+        {'ts': 102, 'pts': 1002, 'updates': [[4, 2]]},
+        {'ts': 103, 'pts': 1003, 'updates': [[4, 3]]},
+    ])
+    long_poll = UserLongPoll(session, mode=2)
+    resumable = ResumableLongPoll(long_poll, MemoryStorage())
+    events = resumable.iter(prefetch=2)
+    assert await events.__anext__() == [4, 1]
+    # Next responses are prefetched
+    await asyncio.sleep(0.01)
+    assert long_poll.ts == 103
+    await events.aclose()
+    assert (long_poll.ts, long_poll.pts) == (101, 1001)
+
+
+async def test_resumable_long_poll_gap():
+    session = Session(
+        [{'ts': 101, 'pts': 1001, 'updates': [[4, 5]]}],
+        history=[VkAPIError({'error_code': 907, 'error_msg': 'Value of ts or pts is too old'}, '')]
+    )
+    resumable = ResumableLongPoll(UserLongPoll(session, mode=2), MemoryStorage({'default': {'ts': 1, 'pts': 1}}))
+    assert await collect(resumable, 1) == [[4, 5]]
+    assert resumable.stats == {'gaps': 1}
+
+
+async def test_resumable_bots_long_poll():
+    session = Session([{'ts': 61, 'updates': [{'type': 'message_new'}]}])
+    resumable = ResumableLongPoll(BotsLongPoll(session, group_id=1), MemoryStorage({'default': {'ts': 60}}))
+    assert await collect(resumable, 1) == [{'type': 'message_new'}]
+    assert session.driver.params[0]['ts'] == 60
+
+
+@pytest.mark.parametrize('storage_class', [FileCheckpointStorage, SqliteCheckpointStorage])
+async def test_checkpoint_storage(storage_class, tmp_path):
+    path = str(tmp_path / 'checkpoints')
+    storage = storage_class(path)
+    assert storage.load('first') is None
+    storage.save('first', {'ts': 1, 'pts': 2})
+    storage.save('second', {'ts': 3, 'pts': None})
+    storage.save('first', {'ts': 4, 'pts': 5})
+    storage.close()
+
+    storage = storage_class(path)
+    assert storage.load('first') == {'ts': 4, 'pts': 5}
+    assert storage.load('second') == {'ts': 3, 'pts': None}
+    storage.close()
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from aiovk import events
+from aiovk.dispatcher import EventDispatcher, get_event_type, get_peer_id
+
+pytestmark = pytest.mark.asyncio
+
+
+def message_new(peer_id, text):
+    return {'type': 'message_new', 'object': {'message': {'peer_id': peer_id, 'text': text}}, 'group_id': 1}
+
+
+@pytest.mark.parametrize(
+    'event, event_type, peer_id', [
+        (message_new(5, 'a'), 'message_new', 5),
+        ({'type': 'group_join', 'object': {'user_id': 1, 'join_type': 'approved'}}, 'group_join', 1),
+        ({'type': 'message_typing_state', 'object': {'from_id': 7}}, 'message_typing_state', 7),
+        ([4, 1, 17, 2000000001, 1500000000, 'text', {}], 4, 2000000001),
+        ([62, 10, 3], 62, 2000000003),
+        ([51, 3, 0], 51, 2000000003),
+        ([8, -10, 1], 8, None),
+        (events.decode([4, 1, 17, 2000000001, 1500000000, 'text', {}]), 4, 2000000001),
+        (events.decode([51, 3, 0]), 51, 2000000003),
+        (events.decode([8, -10, 1]), 8, None),
+        (events.decode([1000, 1]), 1000, None),
+    ]
+)
+async def test_event_routing(event, event_type, peer_id):
+    assert get_event_type(event) == event_type
+    assert get_peer_id(event) == peer_id
+
+
+async def test_dispatcher_order():
+    dispatcher = EventDispatcher(workers=4)
+    handled = []
+
+    @dispatcher.on('message_new')
+    async def handler(event):
+        message = event['object']['message']
+        # Slow handling of the first conversation does not block the second one
+        await asyncio.sleep(0.01 if message['peer_id'] == 1 else 0)
+        handled.append((message['peer_id'], message['text']))
+
+    all_events = []
+    dispatcher.register(None, lambda event: asyncio.sleep(0, all_events.append(event)))
+
+    for i in range(5):
+        await dispatcher.dispatch(message_new(1, i))
+        await dispatcher.dispatch(message_new(2, i))
+    await dispatcher.dispatch({'type': 'group_join', 'object': {'user_id': 3}})
+    await dispatcher.join()
+    await dispatcher.close()
+
+    assert [text for peer_id, text in handled if peer_id == 1] == list(range(5))
+    assert [text for peer_id, text in handled if peer_id == 2] == list(range(5))
+    # Events of the second conversation are handled before the slow first one
+    assert handled.index((2, 4)) < handled.index((1, 4))
+    assert len(all_events) == 11
+    assert dispatcher.stats == {'dispatched': 11, 'handled': 11}
+    assert dispatcher.latency['message_new'][0] == 10
+    assert dispatcher.latency['message_new'][2] >= 0.01
+    assert dispatcher.in_flight == 0
+
+
+async def test_dispatcher_in_flight_limit():
+    dispatcher = EventDispatcher(workers=2, max_in_flight=3)
+    release = asyncio.Event()
+
+    @dispatcher.on()
+    async def handler(event):
+        await release.wait()
+
+    events = [message_new(i, 'a') for i in range(5)]
+    task = asyncio.ensure_future(dispatcher.run(_aiter(events)))
+    await asyncio.sleep(0.01)
+    assert dispatcher.in_flight == 3
+    assert sum(dispatcher.queue_sizes) == 1
+    assert not task.done()
+
+    release.set()
+    await task
+    await dispatcher.join()
+    assert dispatcher.stats['handled'] == 5
+    await dispatcher.close()
+
+
+async def test_dispatcher_close():
+    dispatcher = EventDispatcher(workers=1, max_in_flight=2)
+
+    @dispatcher.on()
+    async def handler(event):
+        await asyncio.sleep(10)
+
+    await dispatcher.dispatch(message_new(1, 'a'))
+    await dispatcher.dispatch(message_new(1, 'b'))
+    blocked = asyncio.ensure_future(dispatcher.dispatch(message_new(1, 'c')))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    await dispatcher.close()
+    await asyncio.wait_for(blocked, 1)
+    assert dispatcher.in_flight == 0
+
+    # Restarted dispatcher has all places free
+    dispatcher.handlers.clear()
+    await dispatcher.dispatch(message_new(1, 'd'))
+    await dispatcher.dispatch(message_new(1, 'e'))
+    await dispatcher.join()
+    assert dispatcher.in_flight == 0
+    await dispatcher.close()
+
+
+async def test_dispatcher_errors():
+    dispatcher = EventDispatcher(workers=1)
+    handled = []
+
+    @dispatcher.on(4)
+    async def failing(event):
+        raise ValueError(event)
+
+    @dispatcher.on(4)
+    async def handler(event):
+        handled.append(event)
+
+    await dispatcher.dispatch([4, 1, 0, 5])
+    await dispatcher.join()
+    await dispatcher.close()
+    assert handled == [[4, 1, 0, 5]]
+    assert dispatcher.stats['errors'] == 1
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
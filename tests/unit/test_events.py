@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from aiovk import events
+from aiovk.drivers import BaseDriver
+from aiovk.longpoll import UserLongPoll
+from aiovk.sessions import BaseSession
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize(
+    'value, flags', [
+        (0, set()),
+        (3, {'unread', 'outbox'}),
+        (8 | 16, {'important', 'chat'}),
+        (65536 | 131072 | 1, {'hidden', 'deleted_for_all', 'unread'}),
+        (1 << 30, set()),
+    ]
+)
+async def test_decode_flags(value, flags):
+    assert events.decode_flags(value) == flags
+
+
+async def test_message_new():
+    event = events.decode([4, 10, 3, 2000000005, 1500000000, 'hello', {'from': '7', 'title': ''}, {}, 0, 15])
+    assert isinstance(event, events.MessageNew)
+    assert event.code == 4
+    assert event.message_id == 10
+    assert event.flags == {'unread', 'outbox'}
+    assert event.outbox
+    assert event.is_chat
+    assert event.peer_id == 2000000005
+    assert event.from_id == 7
+    assert event.text == 'hello'
+    assert event.conversation_message_id == 15
+
+    event = events.decode([4, 11, 1, 5])
+    assert event.from_id == 5
+    # Outgoing message of dialog is sent by the current user
+    assert events.decode([4, 12, 3, 5]).from_id is None
+    assert event.text == ''
+    assert event.timestamp is None
+
+
+@pytest.mark.parametrize(
+    'update, event_class, fields', [
+        ([2, 10, 128, 5], events.MessageFlagsSet, {'message_id': 10, 'flags': {'deleted'}, 'peer_id': 5}),
+        ([7, 5, 10], events.ReadOut, {'peer_id': 5, 'local_id': 10}),
+        ([8, -5, 7, 1500000000], events.FriendOnline, {'user_id': 5, 'platform': 7}),
+        ([9, -5, 1, 1500000000], events.FriendOffline, {'user_id': 5, 'is_timeout': 1}),
+        ([12, 5, 1], events.ConversationFlagsSet, {'peer_id': 5, 'flags': {'important'}}),
+        ([62, 5, 3], events.ChatTyping, {'user_id': 5, 'peer_id': 2000000003}),
+        ([51, 3, 0], events.ChatChanged, {'chat_id': 3, 'peer_id': 2000000003}),
+        ([61, 5, 1], events.Typing, {'user_id': 5, 'peer_id': 5}),
+        ([80, 4, 0], events.CounterUpdate, {'count': 4}),
+        ([1000, 1], events.Event, {'code': 1000}),
+    ]
+)
+async def test_decode(update, event_class, fields):
+    event = events.decode(update)
+    assert type(event) is event_class
+    for name, value in fields.items():
+        assert getattr(event, name) == value
+    assert not hasattr(event, '__dict__')
+
+
+async def test_decode_all():
+    updates = [[4, 1, 0, 5], [8, -5, 7, 0], [4, 2, 0, 5]]
+    assert [event.message_id for event in events.decode_all(updates, codes={4})] == [1, 2]
+    assert len(list(events.decode_all(updates))) == 3
+
+
+class Driver(BaseDriver):
+    async def get_text(self, url, params, headers=None, timeout=None):
+        return 200, json.dumps({'ts': 2, 'updates': [[8, -5, 7, 0], [4, 1, 0, 5, 0, 'text']]}), url
+
+
+class Session(BaseSession):
+    timeout = 10
+
+    def __init__(self):
+        self.driver = Driver()
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, *args, **kwargs) -> dict:
+        return {'key': 'key', 'server': 'server', 'ts': 1}
+
+
+async def test_iter_events():
+    lp = UserLongPoll(Session(), mode=2)
+    async for event in lp.iter_events(codes={events.MessageNew.CODE}):
+        assert isinstance(event, events.MessageNew)
+        assert event.text == 'text'
+        break
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from aiovk.drivers import BaseDriver
+from aiovk.exceptions import VkAPIError
+from aiovk.hedging import HedgingSession
+from aiovk.mixins import LimitRateDriverMixin
+from aiovk.sessions import BaseSession
+
+pytestmark = pytest.mark.asyncio
+
+
+class Session(BaseSession):
+    timeout = 10
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.requests = 0
+        self.cancelled = 0
+        self.params = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        number = self.requests
+        self.requests += 1
+        self.params.append(params)
+        params['access_token'] = 'token'
+        delay = self.delays[number] if number < len(self.delays) else 0
+        try:
+            await asyncio.sleep(abs(delay))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if delay < 0:
+            raise asyncio.TimeoutError()
+        if params.get('user_ids') == -1:
+            raise VkAPIError({'error_code': 113, 'error_msg': 'Invalid user id'}, method_name)
+        return number
+
+
+class LimitedDriver(LimitRateDriverMixin, BaseDriver):
+    pass
+
+
+class LimitedSession(Session):
+    def __init__(self, delays, driver):
+        super().__init__(delays)
+        self.driver = driver
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        await self.driver._limiter.acquire()
+        return await super().send_api_request(method_name, params, timeout, raw_response)
+
+
+async def test_fast_request():
+    session = Session([0.01])
+    hedging_session = HedgingSession(session, initial_delay=0.1)
+    assert await hedging_session.send_api_request('users.get', {}) == 0
+    assert session.requests == 1
+    assert hedging_session.stats == {'requests': 1}
+
+
+async def test_hedged_request():
+    session = Session([1, 0.01])
+    hedging_session = HedgingSession(session, initial_delay=0.02)
+    assert await hedging_session.send_api_request('users.get', {}) == 1
+    assert session.requests == 2
+    await asyncio.sleep(0)
+    assert session.cancelled == 1
+    assert hedging_session.stats == {'requests': 1, 'hedged': 1, 'won': 1}
+
+
+async def test_hedged_request_params():
+    session = Session([1, 0.01])
+    hedging_session = HedgingSession(session, initial_delay=0.02)
+    params = {'user_ids': 1}
+    await hedging_session.send_api_request('users.get', params)
+    assert session.params[0] is not session.params[1]
+    assert params == {'user_ids': 1}
+
+
+async def test_not_hedged_method():
+    session = Session([0.05])
+    hedging_session = HedgingSession(session, initial_delay=0.01)
+    assert await hedging_session.send_api_request('messages.send', {}) == 0
+    assert session.requests == 1
+
+
+async def test_failed_request():
+    session = Session([-0.03, 0.05])
+    hedging_session = HedgingSession(session, initial_delay=0.01)
+    # Failure of the first request does not cancel the second one
+    assert await hedging_session.send_api_request('users.get', {}) == 1
+
+    session = Session([-0.03, -0.01])
+    hedging_session = HedgingSession(session, initial_delay=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await hedging_session.send_api_request('users.get', {})
+
+
+async def test_api_error():
+    session = Session([0.03, 1])
+    hedging_session = HedgingSession(session, initial_delay=0.01)
+    with pytest.raises(VkAPIError):
+        await hedging_session.send_api_request('users.get', {'user_ids': -1})
+    await asyncio.sleep(0)
+    assert session.cancelled == 1
+
+
+async def test_adaptive_delay():
+    session = Session([])
+    hedging_session = HedgingSession(session, percentile=90, window=10, min_samples=10, initial_delay=1,
+                                     min_delay=0.001)
+    assert hedging_session.get_delay('users.get') == 1
+    for i in range(10):
+        session.delays.append(0.001 * (i + 1))
+        await hedging_session.send_api_request('users.get', {})
+    assert 0.01 <= hedging_session.get_delay('users.get') < 0.1
+    assert hedging_session.get_delay('groups.getById') == 1
+
+
+async def test_rate_limited_request():
+    driver = LimitedDriver(requests_per_period=1, period=0.2)
+    driver._limiter.reserve()
+    session = LimitedSession([0.01], driver)
+    hedging_session = HedgingSession(session, initial_delay=0.02)
+    # The first request waits for a slot, the second one would wait even longer
+    assert await hedging_session.send_api_request('users.get', {}) == 0
+    assert session.requests == 1
+    assert hedging_session.stats == {'requests': 1, 'throttled': 1}
+    # Waiting for the slot is not counted as latency of the method
+    assert max(hedging_session._latencies['users.get']) < 0.1
+
+
+async def test_rate_limit_free_slot():
+    driver = LimitedDriver(requests_per_period=10, period=0.1)
+    session = LimitedSession([1, 0.01], driver)
+    hedging_session = HedgingSession(session, initial_delay=0.02)
+    assert await hedging_session.send_api_request('users.get', {}) == 1
+    assert hedging_session.stats == {'requests': 1, 'hedged': 1, 'won': 1}
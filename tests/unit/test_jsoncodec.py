@@ -0,0 +1,35 @@
+import pytest
+
+from aiovk.jsoncodec import JsonCodec, OrjsonCodec, UjsonCodec, get_codec, orjson, ujson
+from aiovk.pools import VkCall, AsyncResult
+
+
+@pytest.mark.parametrize(
+    'codec', [
+        'json',
+        pytest.param('orjson', marks=pytest.mark.skipif(orjson is None, reason='orjson is not installed')),
+        pytest.param('ujson', marks=pytest.mark.skipif(ujson is None, reason='ujson is not installed')),
+    ]
+)
+def test_codec(codec):
+    codec = get_codec(codec)
+    data = {'response': [{'id': 1, 'first_name': 'Павел'}]}
+    assert codec.loads(codec.dumps(data)) == data
+    assert codec.loads(codec.dumps(data).encode()) == data
+    assert 'Павел' in codec.dumps(data)
+
+
+def test_get_codec():
+    codec = JsonCodec()
+    assert get_codec(codec) is codec
+    if orjson is not None:
+        assert isinstance(get_codec(), OrjsonCodec)
+    elif ujson is not None:
+        assert isinstance(get_codec(), UjsonCodec)
+    else:
+        assert type(get_codec()) is JsonCodec
+
+
+def test_execute_representation():
+    call = VkCall(method='users.get', method_args={'user_ids': 1, 'q': 'Павел'}, result=AsyncResult())
+    assert call.get_execute_representation(JsonCodec()) == 'API.users.get({"user_ids": 1, "q": "Павел"})'
@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import pytest
@@ -5,7 +6,7 @@ import pytest
 from aiovk import LongPoll, API
 from aiovk.drivers import BaseDriver
 from aiovk.exceptions import VkLongPollError
-from aiovk.longpoll import BotsLongPoll
+from aiovk.longpoll import BotsLongPoll, LongPollMultiplexer
 from aiovk.sessions import BaseSession
 
 pytestmark = pytest.mark.asyncio
@@ -19,7 +20,7 @@ class Driver(BaseDriver):
     expected_ts = None
     expected_mode = None
 
-    async def get_text(self, url, params, timeout=None):
+    async def get_text(self, url, params, headers=None, timeout=None):
         message = json.dumps(self.messages[self.counter])
         self.counter += 1
         if self.expected_mode is not None:
@@ -175,3 +176,163 @@ async def test_longpoll_iter(longpoll, messages, exception, ts):
         with pytest.raises(exception):
             async for _ in lp.iter():
                 pass
+
+
+class PipelineDriver(BaseDriver):
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.log = []
+
+    async def get_text(self, url, params, headers=None, timeout=None):
+        self.log.append(('request', params['ts']))
+        await asyncio.sleep(0.01)
+        if not self.responses:
+            await asyncio.sleep(10)
+        return 200, json.dumps(self.responses.pop(0)), url
+
+
+async def test_longpoll_iter_prefetch():
+    session = Session()
+    session.driver = PipelineDriver([
+        {'ts': 2, 'updates': [1, 2]},
+        {'ts': 3, 'updates': [3]},
+        {'ts': 4, 'updates': [4]},
+    ])
+    lp = LongPoll(session, mode=0)
+    events = []
+    async for event in lp.iter(prefetch=1):
+        session.driver.log.append(('event', event))
+        events.append(event)
+        # Slow handler
+        await asyncio.sleep(0.02)
+        if event == 4:
+            break
+
+    assert events == [1, 2, 3, 4]
+    log = session.driver.log
+    # Next request is sent before events of the previous response are processed, ts is passed in order
+    assert log.index(('request', 2)) < log.index(('event', 1))
+    assert [item for kind, item in log if kind == 'request'][:4] == [Session.TS, 2, 3, 4]
+
+
+@pytest.mark.parametrize('iter_name', ['iter', 'iter_events'])
+async def test_longpoll_iter_prefetch_stop(iter_name):
+    session = Session()
+    session.driver = PipelineDriver([
+        {'ts': 2, 'updates': [[80, 1]]},
+        {'ts': 3, 'updates': [[80, 2]]},
+        {'ts': 4, 'updates': [[80, 3]]},
+    ])
+    lp = LongPoll(session, mode=0)
+    events = getattr(lp, iter_name)(prefetch=2)
+    await events.__anext__()
+    # Next responses are prefetched
+    await asyncio.sleep(0.05)
+    assert lp.ts == 4
+    await events.aclose()
+    assert lp.ts == 2
+
+
+async def test_longpoll_iter_prefetch_error():
+    session = Session()
+    session.driver = PipelineDriver([{'ts': 2, 'updates': [1]}, {'failed': 4}])
+    lp = LongPoll(session, mode=0)
+    events = []
+    with pytest.raises(VkLongPollError):
+        async for event in lp.iter(prefetch=2):
+            events.append(event)
+    assert events == [1]
+
+
+@pytest.mark.parametrize('status', [403, 500, 502])
+async def test_longpoll_error_status(status):
+    class ErrorDriver(BaseDriver):
+        async def get_text(self, url, params, headers=None, timeout=None):
+            return status, '<html>Error</html>', url
+
+    session = Session()
+    session.driver = ErrorDriver()
+    lp = LongPoll(session, mode=0)
+    with pytest.raises(VkLongPollError) as exc_info:
+        await lp.wait()
+    assert exc_info.value.error == status
+
+
+class MultiplexerDriver(BaseDriver):
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = {url: list(items) for url, items in responses.items()}
+
+    async def get_text(self, url, params, headers=None, timeout=None):
+        await asyncio.sleep(0)
+        responses = self.responses[url]
+        if not responses:
+            await asyncio.sleep(10)
+        response = responses.pop(0)
+        if response is None:
+            return 403, '', url
+        return 200, json.dumps(response), url
+
+
+async def test_longpoll_multiplexer():
+    sessions = {}
+    for name in ('first', 'second'):
+        sessions[name] = Session()
+        sessions[name].SERVER = name
+    driver = MultiplexerDriver({
+        'https://first': [{'ts': 2, 'updates': [1, 2]}, {'ts': 3, 'updates': [3]}],
+        'https://second': [None, {'ts': 2, 'updates': [4]}],
+    })
+    multiplexer = LongPollMultiplexer(
+        {name: LongPoll(session, mode=0) for name, session in sessions.items()},
+        queue_size=1, driver=driver, reconnect_delay=0.01
+    )
+    events = []
+    async with multiplexer:
+        async for source, event in multiplexer:
+            events.append((source, event))
+            if len(events) == 4:
+                break
+
+    assert sorted(events) == [('first', 1), ('first', 2), ('first', 3), ('second', 4)]
+    assert multiplexer.stats == {'events': 4, 'errors': 1}
+    assert not multiplexer.errors
+
+
+@pytest.mark.parametrize('failed', [2, 3])
+async def test_longpoll_wait_without_reconnect(failed):
+    session = Session()
+    session.driver.messages = [{'failed': failed}, {'ts': 2, 'updates': [1]}]
+    lp = LongPoll(session, mode=0)
+    with pytest.raises(VkLongPollError) as exc_info:
+        await lp.wait(reconnect=False)
+    assert exc_info.value.error == failed
+    assert lp.base_url is None
+    response = await lp.wait(reconnect=False)
+    assert response['updates'] == [1]
+
+
+async def test_longpoll_multiplexer_reconnect():
+    sessions = {}
+    for name in ('first', 'second'):
+        sessions[name] = Session()
+        sessions[name].SERVER = name
+    driver = MultiplexerDriver({
+        'https://first': [{'ts': 2, 'updates': [1]}],
+        'https://second': [{'failed': 2}, {'ts': 2, 'updates': [2]}],
+    })
+    multiplexer = LongPollMultiplexer(
+        {name: LongPoll(session, mode=0) for name, session in sessions.items()},
+        driver=driver, reconnect_delay=0.01
+    )
+    events = []
+    async with multiplexer:
+        async for source, event in multiplexer:
+            events.append((source, event))
+            if len(events) == 2:
+                break
+
+    assert sorted(events) == [('first', 1), ('second', 2)]
+    assert multiplexer.stats == {'events': 2, 'reconnects': 1}
+    assert not multiplexer.errors
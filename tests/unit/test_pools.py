@@ -1,10 +1,16 @@
+import asyncio
+import json
 import os
+import re
 import unittest
 from unittest import IsolatedAsyncioTestCase
 
+import pytest
 # from dotenv import load_dotenv
 
-from aiovk.pools import AsyncResult, AsyncVkExecuteRequestPool
+from aiovk.exceptions import VkAPIError, VkException
+from aiovk.pools import AsyncResult, AsyncVkExecuteRequestPool, ExecuteBatchSession
+from aiovk.sessions import BaseSession, SessionWrapper
 
 # load_dotenv(
 #     os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env")
@@ -194,3 +200,173 @@ class ExecutePoolTestCase(IsolatedAsyncioTestCase):
         self.assertIsNotNone(result.error)
         self.assertEqual(27, result.error['error_code'])
         self.assertEqual('likes.isLiked', result.error['method'])
+
+
+class ExecuteTestSession(BaseSession):
+    REQUEST_URL = 'https://api.vk.com/method/'
+    timeout = 10
+
+    def __init__(self):
+        self.requests = []
+        self.timeouts = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        self.requests.append(method_name)
+        self.timeouts.append(timeout)
+        if method_name != 'execute':
+            return params['user_ids']
+        calls = [json.loads(args) for args in re.findall(r'API\.users\.get\((.*?)\)[,\]]', params['code'])]
+        response = [call['user_ids'] if call['user_ids'] > 0 else False for call in calls]
+        errors = [
+            {'method': 'users.get', 'error_code': 113, 'error_msg': 'Invalid user id'}
+            for call in calls if call['user_ids'] <= 0
+        ]
+        return {'response': response, 'execute_errors': errors}
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_groups_concurrent_calls():
+    session = ExecuteTestSession()
+    batch_session = ExecuteBatchSession(session, call_number_per_request=25)
+    results = await asyncio.gather(
+        *(batch_session.send_api_request('users.get', {'user_ids': i}) for i in range(1, 31))
+    )
+    await batch_session.close()
+
+    assert results == list(range(1, 31))
+    assert session.requests == ['execute', 'execute']
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_single_call():
+    session = ExecuteTestSession()
+    batch_session = ExecuteBatchSession(session)
+    result = await batch_session.send_api_request('users.get', {'user_ids': 1})
+
+    assert result == 1
+    assert session.requests == ['users.get']
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_errors():
+    session = ExecuteTestSession()
+    batch_session = ExecuteBatchSession(session)
+    results = await asyncio.gather(
+        batch_session.send_api_request('users.get', {'user_ids': 1}),
+        batch_session.send_api_request('users.get', {'user_ids': -1}),
+        return_exceptions=True
+    )
+
+    assert results[0] == 1
+    assert isinstance(results[1], VkAPIError)
+    assert results[1].error_code == 113
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_wrapped_errors():
+    batch_session = ExecuteBatchSession(SessionWrapper(ExecuteTestSession()))
+    results = await asyncio.gather(
+        batch_session.send_api_request('users.get', {'user_ids': 1}),
+        batch_session.send_api_request('users.get', {'user_ids': -1}),
+        return_exceptions=True
+    )
+
+    assert results[0] == 1
+    assert isinstance(results[1], VkAPIError)
+    assert results[1].url == 'https://api.vk.com/method/users.get'
+
+
+class TruncatedExecuteTestSession(ExecuteTestSession):
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        response = await super().send_api_request(method_name, params, timeout, raw_response)
+        response['response'] = response['response'][:1]
+        return response
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_missing_results():
+    batch_session = ExecuteBatchSession(TruncatedExecuteTestSession())
+    results = await asyncio.wait_for(asyncio.gather(
+        batch_session.send_api_request('users.get', {'user_ids': 1}),
+        batch_session.send_api_request('users.get', {'user_ids': 2}),
+        return_exceptions=True
+    ), 1)
+
+    assert results[0] == 1
+    assert isinstance(results[1], VkException)
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_session_timeout():
+    session = ExecuteTestSession()
+    batch_session = ExecuteBatchSession(session)
+    await batch_session.send_api_request('users.get', {'user_ids': 1}, timeout=1)
+    await asyncio.gather(
+        batch_session.send_api_request('users.get', {'user_ids': 1}, timeout=3),
+        batch_session.send_api_request('users.get', {'user_ids': 2}),
+        batch_session.send_api_request('users.get', {'user_ids': 3}, timeout=5),
+    )
+
+    assert session.timeouts == [1, 5]
+
+
+class ExecutePoolTestSession(ExecuteTestSession):
+    instances = []
+
+    def __init__(self, token):
+        super().__init__()
+        self.token = token
+        self.closed = False
+        self.instances.append(self)
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        if self.token == 'invalid':
+            raise RuntimeError('Request failed')
+        return await super().send_api_request(method_name, params, timeout, raw_response)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_execute_pool_session_without_driver():
+    ExecutePoolTestSession.instances = []
+    pool = AsyncVkExecuteRequestPool(token_session_class=ExecutePoolTestSession)
+    async with pool:
+        result = pool.add_call('users.get', 'token', {'user_ids': 1})
+
+    assert result.result == 1
+    assert [session.closed for session in ExecutePoolTestSession.instances] == [True]
+    assert pool.driver_registry.references == 0
+
+
+@pytest.mark.asyncio
+async def test_execute_pool_closes_sessions_on_error():
+    ExecutePoolTestSession.instances = []
+    pool = AsyncVkExecuteRequestPool(token_session_class=ExecutePoolTestSession)
+    with pytest.raises(RuntimeError):
+        async with pool:
+            pool.add_call('users.get', 'token', {'user_ids': 1})
+            pool.add_call('users.get', 'invalid', {'user_ids': 2})
+
+    assert [session.closed for session in ExecutePoolTestSession.instances] == [True, True]
+    assert pool.sessions == []
+
+
+class FailingInitTestSession(ExecutePoolTestSession):
+    def __init__(self, token, driver=None):
+        super().__init__(token)
+        self.driver = driver
+        raise TypeError('Invalid token type')
+
+
+@pytest.mark.asyncio
+async def test_execute_pool_session_init_error():
+    pool = AsyncVkExecuteRequestPool(token_session_class=FailingInitTestSession)
+    pool.add_call('users.get', 'token', {'user_ids': 1})
+    with pytest.raises(TypeError, match='Invalid token type'):
+        await pool.execute()
+    assert pool.driver_registry.references == 0
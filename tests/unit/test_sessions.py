@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from aiovk.drivers import BaseDriver
+from aiovk.exceptions import VkAPIError, VkAuthError, VkTokensUnavailableError
+from aiovk.jsoncodec import JsonCodec
+from aiovk.sessions import TokenPoolSession, TokenSession
+from aiovk.shaping import RetryPolicy
+
+pytestmark = pytest.mark.asyncio
+
+
+class Driver(BaseDriver):
+    def __init__(self, errors=None, temporary_errors=None):
+        super().__init__()
+        self.errors = errors or {}
+        self.temporary_errors = temporary_errors or []
+        self.tokens = []
+
+    async def post_json(self, url, params, headers=None, timeout=None):
+        token = params.get('access_token')
+        self.tokens.append(token)
+        if token in self.errors:
+            return 200, {'error': {'error_code': self.errors[token], 'error_msg': 'error'}}
+        if self.temporary_errors:
+            return 200, {'error': {'error_code': self.temporary_errors.pop(0), 'error_msg': 'error'}}
+        return 200, {'response': token}
+
+    async def close(self):
+        pass
+
+
+async def test_token_pool_session_round_robin():
+    driver = Driver()
+    session = TokenPoolSession(['1', '2', '3'], driver=driver, requests_per_period=1, period=10)
+    results = await asyncio.gather(*(session.send_api_request('users.get') for _ in range(3)))
+    assert sorted(results) == ['1', '2', '3']
+
+
+async def test_token_pool_session_skips_failed_tokens():
+    driver = Driver({'1': 5, '2': 9})
+    session = TokenPoolSession(['1', '2', '3'], driver=driver)
+    for _ in range(3):
+        assert await session.send_api_request('users.get') == '3'
+    assert driver.tokens.count('1') == 1
+    assert driver.tokens.count('2') == 1
+
+
+async def test_token_pool_session_all_tokens_failed():
+    driver = Driver({'1': 5, '2': 5})
+    session = TokenPoolSession(['1', '2'], driver=driver)
+    with pytest.raises(VkAPIError):
+        await session.send_api_request('users.get')
+    with pytest.raises(VkAuthError):
+        await session.send_api_request('users.get')
+
+
+async def test_token_pool_session_waits_for_rate_limited_tokens():
+    driver = Driver(temporary_errors=[6, 6])
+    session = TokenPoolSession(['1', '2'], driver=driver, period=0.05)
+    with pytest.raises(VkAPIError) as exc_info:
+        await session.send_api_request('users.get')
+    assert exc_info.value.error_code == 6
+    # Both tokens are paused for a period, the request waits for them
+    assert await session.send_api_request('users.get') in ('1', '2')
+
+
+async def test_token_pool_session_tokens_unavailable():
+    driver = Driver({'1': 9, '2': 9})
+    session = TokenPoolSession(['1', '2'], driver=driver)
+    with pytest.raises(VkAPIError):
+        await session.send_api_request('users.get')
+    with pytest.raises(VkTokensUnavailableError) as exc_info:
+        await session.send_api_request('users.get')
+    assert not isinstance(exc_info.value, VkAuthError)
+    assert 0 < exc_info.value.retry_after <= 60
+
+
+async def test_token_pool_session_retry_policy():
+    driver = Driver(temporary_errors=[10])
+    session = TokenPoolSession(['1'], driver=driver, retry_policy=RetryPolicy(base_delay=0.001))
+    assert await session.send_api_request('users.get') == '1'
+    assert driver.tokens == ['1', '1']
+
+
+async def test_token_pool_session_json_codec():
+    codec = JsonCodec()
+    session = TokenPoolSession(['1'], json_codec=codec)
+    assert session.json_codec is codec
+    assert session.driver.json_codec is codec
+    await session.close()
+
+
+async def test_token_pool_session_other_errors():
+    driver = Driver({'1': 100})
+    session = TokenPoolSession(['1', '2'], driver=driver)
+    with pytest.raises(VkAPIError):
+        await session.send_api_request('users.get')
+    assert driver.tokens == ['1']
+
+
+class RefreshTokenSession(TokenSession):
+    authorizations = 0
+
+    async def authorize(self):
+        self.authorizations += 1
+        await asyncio.sleep(0.01)
+        self.access_token = 'new'
+
+
+async def test_token_session_single_authorization():
+    driver = Driver({'old': 5})
+    session = RefreshTokenSession('old', driver=driver)
+    results = await asyncio.gather(*(session.send_api_request('users.get') for _ in range(10)))
+    assert results == ['new'] * 10
+    assert session.authorizations == 1
+
+
+async def test_token_session_bounded_retries():
+    driver = Driver({'old': 5, 'new': 5})
+    session = RefreshTokenSession('old', driver=driver)
+    with pytest.raises(VkAPIError):
+        await session.send_api_request('users.get')
+    assert len(driver.tokens) == TokenSession.RETRIES + 1
+
+
+async def test_token_session_authorization_error():
+    driver = Driver({'token': 5})
+    session = TokenSession('token', driver=driver)
+    results = await asyncio.gather(*(session.send_api_request('users.get') for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, VkAuthError) for result in results)
+
+
+async def test_token_session_retry_policy():
+    driver = Driver(temporary_errors=[6, 10])
+    policy = RetryPolicy(base_delay=0.001)
+    session = TokenSession('token', driver=driver, retry_policy=policy)
+    assert await session.send_api_request('users.get') == 'token'
+    assert policy.stats == {6: 1, 10: 1}
+
+
+async def test_token_session_without_retry_policy():
+    driver = Driver(temporary_errors=[6])
+    session = TokenSession('token', driver=driver)
+    with pytest.raises(VkAPIError):
+        await session.send_api_request('users.get')
@@ -1,10 +1,13 @@
 import asyncio
 import time
 
+import aiohttp
 import pytest
 
 from aiovk.drivers import BaseDriver
-from aiovk.mixins import LimitRateDriverMixin
+from aiovk.exceptions import VkCircuitOpenError
+from aiovk.mixins import CircuitBreakerDriverMixin, LimitRateDriverMixin, RetryDriverMixin, TokenLimitRateDriverMixin
+from aiovk.shaping import CircuitBreaker, RateLimiter, RetryPolicy, TaskQueue
 
 pytestmark = pytest.mark.asyncio
 
@@ -21,6 +24,10 @@ class LimitRateTestDriver(LimitRateDriverMixin, LimitRateBaseTestDriver):
     pass
 
 
+class TokenLimitRateTestDriver(TokenLimitRateDriverMixin, LimitRateBaseTestDriver):
+    pass
+
+
 @pytest.mark.parametrize(
     'period, requests_per_period, rps, lower, upper', [
         (1, 1, 1, 0, 0.02),
@@ -37,3 +44,230 @@ async def test_request_shaper_mixin(period, requests_per_period, rps, lower, upp
     await driver.close()
     max_time = max(v[1] for v in data)
     assert lower <= max_time - t0 <= upper
+
+
+@pytest.mark.parametrize(
+    'requests_per_period, period, burst, lower, upper', [
+        (3, 0.3, None, 0.3, 0.32),
+        (3, 0.3, 1, 0.5, 0.52),
+        (2, 0.2, 1, 0.5, 0.52),
+    ]
+)
+async def test_request_shaper_mixin_burst(requests_per_period, period, burst, lower, upper):
+    driver = LimitRateTestDriver(period=period, requests_per_period=requests_per_period, burst=burst)
+    t0 = time.time()
+    data = await asyncio.gather(*(driver.post_json() for _ in range(6)))
+    await driver.close()
+    max_time = max(v[1] for v in data)
+    assert lower <= max_time - t0 <= upper
+
+
+@pytest.mark.parametrize('burst', [1, 2, 5])
+async def test_rate_limiter_sliding_window(burst):
+    limiter = RateLimiter(5, 1, burst)
+    slots = [limiter.reserve(now=0) for _ in range(50)]
+    assert slots[:burst] == [0] * burst
+    for i, slot in enumerate(slots):
+        assert len([s for s in slots[i:] if s < slot + 1 - 1e-9]) <= 5
+
+
+async def test_token_limit_rate_mixin():
+    driver = TokenLimitRateTestDriver(period=1, requests_per_period=1)
+    t0 = time.time()
+    data = await asyncio.gather(*(
+        driver.post_json('https://api.vk.com/method/users.get', {'access_token': str(i)}) for i in range(5)
+    ))
+    assert max(v[1] for v in data) - t0 <= 0.02
+
+    _, t1 = await driver.post_json('https://api.vk.com/method/users.get', params={'access_token': '0'})
+    assert 1 <= t1 - t0 <= 1.02
+    await driver.close()
+
+
+async def test_token_limit_rate_mixin_sweep():
+    driver = TokenLimitRateTestDriver(period=0.01, requests_per_period=1)
+    driver._sweep_size = 2
+    await driver.post_json('', {'access_token': '1'})
+    await driver.post_json('', {'access_token': '2'})
+    await asyncio.sleep(0.02)
+    await driver.post_json('', {'access_token': '3'})
+    assert list(driver._limiters) == ['3']
+    await driver.close()
+
+
+class FailingTestDriver(BaseDriver):
+    def __init__(self, failures, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = list(failures)
+        self.calls = 0
+
+    async def post_json(self, *args, **kwargs):
+        self.calls += 1
+        if self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure, None
+        return 200, {}
+
+
+class RetryTestDriver(RetryDriverMixin, FailingTestDriver):
+    pass
+
+
+@pytest.mark.parametrize(
+    'failures, calls', [
+        ([], 1),
+        ([asyncio.TimeoutError(), 502], 3),
+        ([aiohttp.ServerDisconnectedError()] * 3, 4),
+    ]
+)
+async def test_retry_mixin(failures, calls):
+    policy = RetryPolicy(base_delay=0.001)
+    driver = RetryTestDriver(failures, retry_policy=policy)
+    status, _ = await driver.post_json('https://api.vk.com/method/users.get', {})
+    assert status == 200
+    assert driver.calls == calls
+    assert sum(policy.stats.values()) == calls - 1
+
+
+@pytest.mark.parametrize(
+    'failures, exception', [
+        ([asyncio.TimeoutError()] * 3, asyncio.TimeoutError),
+        ([aiohttp.InvalidURL('url')], aiohttp.InvalidURL),
+    ]
+)
+async def test_retry_mixin_gives_up(failures, exception):
+    driver = RetryTestDriver(failures, retry_policy=RetryPolicy(base_delay=0.001))
+    with pytest.raises(exception):
+        await driver.post_json('https://api.vk.com/method/users.get', {})
+
+
+async def test_retry_mixin_server_error_response():
+    driver = RetryTestDriver([500] * 4, retry_policy=RetryPolicy(base_delay=0.001))
+    status, _ = await driver.post_json('https://api.vk.com/method/users.get', {})
+    assert status == 500
+    assert driver.calls == 4
+
+
+@pytest.mark.parametrize(
+    'failures, calls, exception', [
+        ([asyncio.TimeoutError()], 1, asyncio.TimeoutError),
+        ([aiohttp.ServerDisconnectedError()], 1, aiohttp.ServerDisconnectedError),
+        ([502], 1, None),
+        ([aiohttp.ClientConnectorError(None, OSError())], 2, None),
+    ]
+)
+async def test_retry_mixin_not_idempotent(failures, calls, exception):
+    driver = RetryTestDriver(failures, retry_policy=RetryPolicy(base_delay=0.001))
+    if exception is None:
+        await driver.post_json('https://api.vk.com/method/messages.send', {})
+    else:
+        with pytest.raises(exception):
+            await driver.post_json('https://api.vk.com/method/messages.send', {})
+    assert driver.calls == calls
+
+
+async def test_retry_mixin_idempotent_methods():
+    driver = RetryTestDriver([asyncio.TimeoutError()], retry_policy=RetryPolicy(base_delay=0.001),
+                             idempotent_methods={'messages.markAsRead'})
+    await driver.post_json('https://api.vk.com/method/messages.markAsRead', {})
+    assert driver.calls == 2
+    assert not driver.is_idempotent('post_json', 'https://api.vk.com/method/users.get')
+    assert driver.is_idempotent('get_bin', 'https://example.com/image.jpg')
+
+
+async def test_retry_policy_deadline():
+    policy = RetryPolicy(base_delay=1, max_delay=1, deadline=0.5)
+    delays = [policy.get_delay(6, 0, time.monotonic()) for _ in range(100)]
+    assert all(delay is None or delay <= 0.5 for delay in delays)
+    assert policy.get_delay(100, 0, time.monotonic()) is None
+
+
+async def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window=10, open_timeout=5, probes=2)
+    for success in (True, False, True):
+        assert breaker.allow(0)
+        breaker.record(success, 0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow(1)
+    breaker.record(False, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(2)
+    assert breaker.retry_after(2) == 4
+
+    # Half-open state allows only probes
+    assert breaker.allow(6)
+    assert breaker.allow(6)
+    assert not breaker.allow(6)
+    breaker.record(True, 6)
+    breaker.cancel()
+    assert breaker.allow(7)
+    breaker.record(True, 7)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # Failure of a probe opens the circuit again
+    breaker = CircuitBreaker(min_requests=1, open_timeout=5)
+    breaker.allow(0)
+    breaker.record(False, 0)
+    assert breaker.allow(5)
+    breaker.record(False, 5)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(9)
+
+
+async def test_circuit_breaker_window():
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, window=10)
+    breaker.allow(0)
+    breaker.record(False, 0)
+    # Old failures are out of the window
+    for now in (11, 12, 13):
+        breaker.allow(now)
+        breaker.record(now != 13, now)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.is_idle(24)
+
+
+class CircuitBreakerTestDriver(RetryDriverMixin, CircuitBreakerDriverMixin, FailingTestDriver):
+    pass
+
+
+async def test_circuit_breaker_mixin():
+    driver = CircuitBreakerTestDriver(
+        [asyncio.TimeoutError(), 502, 404],
+        retry_policy=RetryPolicy(retries={'timeout': 1}, base_delay=0.001),
+        circuit_breaker_args={'min_requests': 2, 'open_timeout': 10}
+    )
+    status, _ = await driver.post_json('https://api.vk.com/method/users.get', {})
+    assert status == 502
+    with pytest.raises(VkCircuitOpenError) as exc_info:
+        await driver.post_json('https://api.vk.com/method/users.get?a=1', {})
+    assert driver.calls == 2
+    assert exc_info.value.endpoint == 'api.vk.com/method/users.get'
+    assert 0 < exc_info.value.retry_after <= 10
+
+    # Other methods are not affected, client errors are not failures
+    status, _ = await driver.post_json('https://api.vk.com/method/groups.getById', {})
+    assert status == 404
+    status, _ = await driver.post_json('https://api.vk.com/method/groups.getById', {})
+    assert status == 200
+
+
+async def test_circuit_breaker_mixin_invalid_json():
+    driver = CircuitBreakerTestDriver(
+        [ValueError('Expecting value'), ValueError('Expecting value')],
+        retry_policy=RetryPolicy(base_delay=0.001),
+        circuit_breaker_args={'min_requests': 2, 'open_timeout': 10}
+    )
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await driver.post_json('https://api.vk.com/method/users.get', {})
+    with pytest.raises(VkCircuitOpenError):
+        await driver.post_json('https://api.vk.com/method/users.get', {})
+    assert driver.calls == 2
+
+
+async def test_task_queue_deprecated():
+    with pytest.warns(DeprecationWarning):
+        queue = TaskQueue(1, 1)
+    queue.cancel()
@@ -0,0 +1,88 @@
+import asyncio
+import io
+
+import pytest
+
+from aiovk import API
+from aiovk.drivers import BaseDriver
+from aiovk.exceptions import VkUploadError
+from aiovk.sessions import BaseSession
+from aiovk.uploads import Uploader
+
+pytestmark = pytest.mark.asyncio
+
+
+class Driver(BaseDriver):
+    def __init__(self):
+        super().__init__()
+        self.uploads = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def post_files(self, url, files, headers=None, timeout=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        content = files['photo'].read()
+        self.uploads.append((url, content))
+        if content == b'broken':
+            return 200, {'error': 'ERR_UPLOAD_BAD_IMAGE_SIZE'}
+        return 200, {'server': 1, 'photo': content.decode(), 'hash': 'hash'}
+
+
+class Session(BaseSession):
+    timeout = 10
+
+    def __init__(self):
+        self.driver = Driver()
+        self.requests = []
+
+    async def __aenter__(self):
+        pass
+
+    async def send_api_request(self, method_name, params=None, timeout=None, raw_response=False):
+        self.requests.append(method_name)
+        if method_name == 'photos.getMessagesUploadServer':
+            await asyncio.sleep(0.01)
+            return {'upload_url': f'https://upload.vk.com/{params["peer_id"]}'}
+        if method_name == 'photos.saveMessagesPhoto':
+            return [{'id': params['photo']}]
+        if method_name == 'execute':
+            count = params['code'].count('API.photos.saveMessagesPhoto')
+            return {'response': [[{'id': i}] for i in range(count)]}
+
+
+async def test_upload():
+    session = Session()
+    uploader = Uploader(API(session))
+    result = await uploader.upload('message_photo', io.BytesIO(b'1'), {'peer_id': 1})
+    await uploader.upload('message_photo', io.BytesIO(b'2'), {'peer_id': 1})
+    await uploader.upload('message_photo', io.BytesIO(b'3'), {'peer_id': 2})
+
+    assert result == [{'id': '1'}]
+    assert session.requests.count('photos.getMessagesUploadServer') == 2
+    assert [url for url, _ in session.driver.uploads] == [
+        'https://upload.vk.com/1', 'https://upload.vk.com/1', 'https://upload.vk.com/2'
+    ]
+
+
+async def test_upload_error():
+    session = Session()
+    uploader = Uploader(API(session))
+    with pytest.raises(VkUploadError):
+        await uploader.upload('message_photo', io.BytesIO(b'broken'), {'peer_id': 1})
+    await uploader.upload('message_photo', io.BytesIO(b'1'), {'peer_id': 1})
+    assert session.requests.count('photos.getMessagesUploadServer') == 2
+
+
+async def test_upload_many():
+    session = Session()
+    uploader = Uploader(API(session), concurrency=3)
+    files = [io.BytesIO(b'broken') if i == 5 else io.BytesIO(str(i).encode()) for i in range(30)]
+    results = await uploader.upload_many('message_photo', files, {'peer_id': 1})
+
+    assert session.driver.max_in_flight == 3
+    assert session.requests.count('photos.getMessagesUploadServer') == 1
+    assert session.requests.count('execute') == 2
+    assert [result.ok for result in results] == [i != 5 for i in range(30)]